@@ -6,6 +6,64 @@ from __future__ import print_function
 import sys
 import os
 import re
+import math
+import bisect
+import glob
+import time
+import json
+import hashlib
+import collections
+import copy
+import mmap
+import itertools
+from array import array
+
+# 启动时只导入交互模式需要的模块，NumPy、进程池、命令行参数解析及HTTP服务等模块在使用时才导入
+# NumPy在第一次处理区块数不少于NUMPY_MIN_BLOCKS的区块组时由loadNumpy导入，小钻带不需要承担导入NumPy的耗时
+numpy = None
+numpyLoaded = False
+NUMPY_MIN_BLOCKS = 50000
+
+# --profile时统计调用次数及耗时分布的热点函数及计时方式，call为每次调用的耗时，generator为生成器内部的耗时之和，
+# lines为钻带逐行处理循环中每行的耗时；只包括rewritePrg处理钻带时实际调用的函数，GridData及optimizeBlockOrder用于
+# 区块数少于NUMPY_MIN_BLOCKS的区块组，numpyBlockOrder用于较大的区块组
+# instrumentHotPaths替换这些函数后hotPathStats才不为None，未启用时没有额外开销
+hotPaths = (('tokenizePrg', 'lines'), ('parseNumber', 'call'), ('GlvFileIndex.lookup', 'call'),
+            ('segmentOrder', 'call'), ('blockOrder', 'call'), ('GridData.fromItems', 'call'),
+            ('CompactGridData.fromPositions', 'call'), ('optimizeBlockOrder', 'generator'),
+            ('numpyBlockOrder', 'call'), ('ringDepths', 'call'), ('outputBlock', 'call'))
+hotPathStats = None
+clock = getattr(time, 'perf_counter', time.time)
+
+regBlock = re.compile(r'N(\d+)G1X-?\d+Y-?\d+')       # 区块指令
+regTool = re.compile(r'M1(0[1-9]|[1-4]\d|50)')        # 刀具切换指令
+regGlvIndex = re.compile(r'M9(0\d)')                  # Glv数据文件切换指令
+regLine = re.compile(r'M1(0[1-9]|[1-4]\d|50)|N(\d+)G1X(-?\d+)Y(-?\d+)|M9(0\d)')     # 一次识别以上三种指令
+regBlockXY = re.compile(r'N\d+G1X(-?\d+)Y(-?\d+)')  # 区块指令的X,Y坐标
+regSide = re.compile(r'lsr(\d\d)(\d\d)')             # 钻带文件名中的层别
+regM900 = re.compile(r'^\s*M900\s*$', re.M)          # 多行文本中的M900指令
+regM900Bytes = re.compile(br'^\s*M900\s*$', re.M)
+regOptimized = re.compile(r'^\s*\(Drilling Path Optimized\)\s*$', re.M)     # 多行文本中已经优化过加工路径的备注
+regOptimizedBytes = re.compile(br'^\s*\(Drilling Path Optimized\)\s*$', re.M)
+regArea = re.compile(r'\(Area:X=(\d+(?:\.\d*)?),Y=(\d+(?:\.\d*)?)\)')     # 程式头中的扫描区域大小(mm)
+
+# checkPrgMessage中需要检查的程式头及钻带末尾设置
+prgMarkers = frozenset(['(BEST DIVISION:SP1_DIV)', '(X MIRROR:ON)', '(X MIRROR:OFF)', '(Drilling Path Optimized)'])
+
+# 镭射机的钻带格式设置，numberLength及leadZero为区块坐标的parseNumber参数，area为程式头中没有扫描区域设置时使用的大小(mm)，
+# area为None时程式头中必须有扫描区域设置，除非使用--area指定；可以使用--machine指定其中的名称，或者指定包含以上设置的JSON文件
+machineProfiles = {
+    'default': {'numberLength': 3, 'leadZero': False, 'area': None},
+}
+# 没有任何扫描区域设置时(直接调用rewritePrg等函数)划分Cell的大小(mm)，与原有回形路径的Cell间隔相同
+DEFAULT_AREA = (30.0, 30.0)
+
+# 优化结果缓存的默认目录，缓存格式或区块排序算法改变时需要增加CACHE_VERSION使原有缓存失效
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.laserPrgOptimizer', 'cache')
+CACHE_VERSION = 3
+
+# optimizeStream及HTTP服务预先扫描钻带时，不能定位的输入在内存中最多缓存的字节数，超过时写入临时文件
+SPOOL_SIZE = 64 * 1024 * 1024
 
 if sys.version_info[0] == 2:
     input = raw_input
@@ -32,7 +90,10 @@ class GridData(object):
         self.__originY = None
         self.__width = 0
         self.__height = 0
-        self.__gridData = [[[]]]
+        self.__gridData = [[collections.deque()]]     # 每个Cell中的元素保存在deque中，从首尾取出元素的复杂度为O(1)
+        self.__count = 0            # Grid中所有元素的总数
+        self.__columnCounts = [0]   # 每一列中的元素个数
+        self.__rowCounts = [0]      # 每一行中的元素个数
 
     @property
     def pitchX(self):
@@ -101,6 +162,52 @@ class GridData(object):
         else:
             return (x, y)
 
+    @classmethod
+    def fromItems(cls, items, pitchX, pitchY, posParser=None):
+        """
+        根据全部数据一次性创建GridData对象，先扫描所有数据的坐标计算Grid范围，再一次性分配全部Cell
+        创建结果与依次调用addItem添加数据相同，但避免了逐行逐列扩充Grid边界的开销
+        @param items: 需要保存至Grid中的全部数据
+        @type items: iterable
+        @param pitchX:Grid对象中每个Cell区块在X方向上的间隔大小.
+        @param pitchY:Grid对象中每个Cell区块在Y方向上的间隔大小.
+        @param posParser: 数据中的X,Y坐标值的解析器函数，为None时使用默认的posParser
+        @return: 保存了全部数据的GridData对象
+        @rtype: GridData
+        """
+        grid = cls(pitchX, pitchY)
+        if posParser is not None:
+            grid.posParser = posParser
+        items = list(items)
+        if not items:
+            return grid
+
+        # 第一遍扫描：计算每个数据的索引及Grid范围
+        positions = [grid.posParser(data) for data in items]
+        columns, originX = cellIndexes([p[0] for p in positions], grid.__pitchX)
+        rows, originY = cellIndexes([p[1] for p in positions], grid.__pitchY)
+        width = max(columns) + 1
+        height = max(rows) + 1
+
+        # 一次性分配全部Cell后，第二遍将数据保存至对应的Cell中
+        gridData = [[collections.deque() for r in range(height)] for c in range(width)]
+        columnCounts = [0] * width
+        rowCounts = [0] * height
+        for data, column, row in zip(items, columns, rows):
+            gridData[column][row].append(data)
+            columnCounts[column] += 1
+            rowCounts[row] += 1
+
+        grid.__originX = originX
+        grid.__originY = originY
+        grid.__width = width
+        grid.__height = height
+        grid.__gridData = gridData
+        grid.__count = len(items)
+        grid.__columnCounts = columnCounts
+        grid.__rowCounts = rowCounts
+        return grid
+
     def addItem(self, data):
         """
         根据数据的坐标位置添加至对应的Grid表子单元中
@@ -120,35 +227,42 @@ class GridData(object):
         while int(round((x-self.__originX)/self.__pitchX))+1 > self.__width:
             column = []
             for i in range(self.__height):
-                column.append([])
+                column.append(collections.deque())
             self.__gridData.append(column)
+            self.__columnCounts.append(0)
             self.__width += 1
 
         # X坐标小于当前Grid下界时扩充X负方向边界
         while int(round((x-self.__originX)/self.__pitchX)) < 0:
             column = []
             for i in range(self.__height):
-                column.append([])
+                column.append(collections.deque())
             self.__gridData.insert(0, column)
+            self.__columnCounts.insert(0, 0)
             self.__width += 1
             self.__originX -= self.__pitchX
 
         # Y坐标大于当前Grid上界时扩充Y正方向边界
         while int(round((y-self.__originY)/self.__pitchY))+1 > self.__height:
             for column in self.__gridData:
-                column.append([])
+                column.append(collections.deque())
+            self.__rowCounts.append(0)
             self.__height += 1
 
         # Y坐标小于当前Grid下界时扩充X负方向边界
         while int(round((y-self.__originY)/self.__pitchY)) < 0:
             for column in self.__gridData:
-                column.insert(0, [])
+                column.insert(0, collections.deque())
+            self.__rowCounts.insert(0, 0)
             self.__height += 1
             self.__originY -= self.__pitchY
 
         posX = int(round((x-self.__originX)/self.__pitchX))
         posY = int(round((y-self.__originY)/self.__pitchY))
         self.__gridData[posX][posY].append(data)
+        self.__count += 1
+        self.__columnCounts[posX] += 1
+        self.__rowCounts[posY] += 1
 
     def getIndex(self, data):
         """
@@ -169,6 +283,7 @@ class GridData(object):
     def getItems(self, column, row):
         """
         根据(column,row)索引返回对应Cell区间中的所有元素
+        注意返回的是新建的list对象，修改该list不会影响Grid中保存的数据
         @param column:要查询的Cell在x方向的列索引，索引可以为负值
         @type column:int
         @param row:要查询的Cell在y方向的行索引，索引可以为负值
@@ -177,7 +292,7 @@ class GridData(object):
         @rtype:list
         @raise IndexError:待查询的数据索引超过了当前Grid的界限范围
         """
-        return self.__gridData[column][row]
+        return list(self.__gridData[column][row])
 
     def getItem(self, column, row, index):
         """
@@ -196,7 +311,7 @@ class GridData(object):
 
     def popItem(self, column, row, index=-1):
         """
-        根据(column,row)索引取出指定Cell中index指定的元素
+        根据(column,row)索引取出指定Cell中index指定的元素，取出Cell首尾元素的复杂度为O(1)
         @param column: 要查询的Cell在x方向的列索引，索引可以为负值
         @type column: int
         @param row: 要查询的Cell在y方向的行索引，索引可以为负值
@@ -207,7 +322,18 @@ class GridData(object):
         @rtype: object
         @raise IndexError:待查询的数据索引超过了当前Grid的界限范围
         """
-        return self.__gridData[column][row].pop(index)
+        cell = self.__gridData[column][row]
+        if index == 0:
+            data = cell.popleft()
+        elif index == -1:
+            data = cell.pop()
+        else:
+            data = cell[index]
+            del cell[index]
+        self.__count -= 1
+        self.__columnCounts[column] -= 1
+        self.__rowCounts[row] -= 1
+        return data
 
     def countItems(self, column=None, row=None):
         """
@@ -220,20 +346,15 @@ class GridData(object):
         @rtype:int
         @raise IndexError:待查询的数据索引超过了当前Grid的界限范围
         """
-        count = 0
+        # 元素个数在addItem/popItem时同步更新，查询时无需遍历Cell
         if column is None and row is None:
-            for column in range(self.__width):
-                for row in range(self.__height):
-                    count += len(self.__gridData[column][row])
+            return self.__count
         elif column is None:
-            for c in range(self.__width):
-                count += len(self.__gridData[c][row])
+            return self.__rowCounts[row]
         elif row is None:
-            for r in range(self.__height):
-                count += len(self.__gridData[column][r])
+            return self.__columnCounts[column]
         else:
-            count = len(self.__gridData[column][row])
-        return count
+            return len(self.__gridData[column][row])
 
     def delAllItems(self):
         """
@@ -244,7 +365,10 @@ class GridData(object):
         self.__originY = None
         self.__width = 0
         self.__height = 0
-        self.__gridData = [[[]]]
+        self.__gridData = [[collections.deque()]]
+        self.__count = 0
+        self.__columnCounts = [0]
+        self.__rowCounts = [0]
 
     def optimizeGrid(self):
         """
@@ -255,26 +379,459 @@ class GridData(object):
         while self.countItems(column=0) == 0 and self.__width > 1:
             # 删除左侧空列
             self.__gridData.pop(0)
+            self.__columnCounts.pop(0)
             self.__originX += self.__pitchX
             self.__width -= 1
         while self.countItems(column=self.__width-1) == 0 and self.__width > 1:
             # 删除右侧空列
             self.__gridData.pop(-1)
+            self.__columnCounts.pop(-1)
             self.__width -= 1
         while self.countItems(row=0) == 0 and self.__height > 1:
             # 删除下方空行
             for i in range(self.__width):
                 self.__gridData[i].pop(0)
+            self.__rowCounts.pop(0)
             self.__originY += self.__pitchY
             self.__height -= 1
         while self.countItems(row=self.__height-1) == 0 and self.__height > 1:
             # 删除上方空行
             for i in range(self.__width):
                 self.__gridData[i].pop(-1)
+            self.__rowCounts.pop(-1)
+            self.__height -= 1
+
+    def orderCells(self, order):
+        """
+        重新排列每个Cell中元素的先后顺序，optimizeBlockOrder每次从Cell中取出第一个元素，即按此顺序依次取出
+        @param order: 排序函数，参数为Cell中按当前顺序排列的元素列表，返回按新顺序排列的元素在该列表中的索引，
+                      只对有多个元素的Cell调用
+        @return: None
+        """
+        for column in self.__gridData:
+            for row, cell in enumerate(column):
+                if len(cell) > 1:
+                    items = list(cell)
+                    column[row] = collections.deque(items[i] for i in order(items))
+
+    def showGrid(self):
+        print([[list(cell) for cell in column] for column in self.__gridData])
+
+
+class CompactGridData(object):
+    """
+    使用紧凑数组保存三菱机区块指令的GridData，对外接口与GridData相同
+    区块编号和X,Y坐标保存在连续的array数组中，Cell中的区块通过CSR格式的偏移表索引，不再为每个区块保存字符串和为每个Cell创建list
+    添加数据后会在下一次查询时重新建立偏移表，因此适合先添加全部数据再依次取出的使用方式
+    使用fromPositions创建时保存的元素为区块的索引，只保存每个区块所在的Cell，供blockOrder在指定compact时使用
+    """
+    __slots__ = ('__pitchX', '__pitchY', '__posParser', '__indexItems', '__originX', '__originY',
+                 '__shiftX', '__shiftY', '__width', '__height', '__count',
+                 '__blockN', '__blockX', '__blockY', '__columns', '__rows', '__texts',
+                 '__built', '__builtSize', '__builtShiftX', '__builtShiftY', '__builtHeight',
+                 '__order', '__starts', '__ends', '__columnCounts', '__rowCounts')
+
+    __reBlock = re.compile(r'N(\d+)G1X(-?\d+)Y(-?\d+)')
+
+    def __init__(self, pitchX, pitchY, posParser=None):
+        """
+        初始化CompactGridData对象.
+        @param pitchX:Grid对象中每个Cell区块在X方向上的间隔大小.
+        @param pitchY:Grid对象中每个Cell区块在Y方向上的间隔大小.
+        @param posParser: 区块指令的X,Y坐标解析器函数，为None时使用parseBlockXY
+        @return:None
+        """
+        self.__pitchX = abs(pitchX)
+        self.__pitchY = abs(pitchY)
+        self.__posParser = posParser
+        self.__indexItems = False
+        self.delAllItems()
+
+    @classmethod
+    def fromItems(cls, items, pitchX, pitchY, posParser=None):
+        """
+        根据全部数据创建CompactGridData对象，参数与GridData.fromItems相同
+        @return: 保存了全部数据的CompactGridData对象
+        @rtype: CompactGridData
+        """
+        grid = cls(pitchX, pitchY, posParser)
+        for data in items:
+            grid.addItem(data)
+        return grid
+
+    @classmethod
+    def fromPositions(cls, positions, pitchX, pitchY):
+        """
+        根据区块坐标列表一次性创建CompactGridData对象，保存的元素为区块在positions中的索引，
+        每个区块只保存所在Cell的行列索引，Cell的划分与GridData.fromItems(range(len(positions)), ...)相同
+        @param positions: 按原始顺序排列的区块(x,y)坐标列表
+        @type positions: list
+        @param pitchX:Grid对象中每个Cell区块在X方向上的间隔大小.
+        @param pitchY:Grid对象中每个Cell区块在Y方向上的间隔大小.
+        @return: 保存了全部区块索引的CompactGridData对象
+        @rtype: CompactGridData
+        """
+        grid = cls(pitchX, pitchY, positions.__getitem__)
+        grid.__indexItems = True
+        if not positions:
+            return grid
+        columns, grid.__originX = cellIndexes([p[0] for p in positions], grid.__pitchX)
+        rows, grid.__originY = cellIndexes([p[1] for p in positions], grid.__pitchY)
+        grid.__columns = array('i', columns)
+        grid.__rows = array('i', rows)
+        grid.__width = max(columns) + 1
+        grid.__height = max(rows) + 1
+        grid.__count = len(positions)
+        return grid
+
+    @property
+    def pitchX(self):
+        """
+        只读属性，返回当前Grid对象在X轴方向划分Cell的间隔
+        @rtype: float or int
+        """
+        return self.__pitchX
+
+    @property
+    def pitchY(self):
+        """
+        只读属性，返回当前Grid对象在Y轴方向划分Cell的间隔
+        @rtype: float or int
+        """
+        return self.__pitchY
+
+    @property
+    def width(self):
+        """
+        只读属性，返回Grid在X方向的Cell个数
+        @rtype: int
+        """
+        return self.__width
+
+    @property
+    def height(self):
+        """
+        只读属性，返回Grid在Y方向的Cell个数
+        @rtype: int
+        """
+        return self.__height
+
+    def posParser(self, data):
+        """
+        解析区块指令的X,Y坐标，创建对象时未指定posParser则使用parseBlockXY
+        @rtype: tuple(x,y)
+        """
+        if self.__posParser is None:
+            return parseBlockXY(data)
+        return self.__posParser(data)
+
+    def addItem(self, data):
+        """
+        根据区块的坐标位置添加至对应的Cell中，Cell索引的计算方式与GridData.addItem完全相同
+        @param data: 需要增加的区块指令
+        @return: None
+        """
+        x, y = self.posParser(data)
+        if self.__originX is None:
+            self.__originX = x
+            self.__originY = y
+            self.__width = 1
+            self.__height = 1
+
+        # 向负方向扩充边界时原点逐格移动，已保存区块的相对索引保持不变
+        column = int(round((x-self.__originX)/self.__pitchX))
+        while column < 0:
+            self.__originX -= self.__pitchX
+            self.__shiftX += 1
+            self.__width += 1
+            column = int(round((x-self.__originX)/self.__pitchX))
+        if column+1 > self.__width:
+            self.__width = column+1
+        row = int(round((y-self.__originY)/self.__pitchY))
+        while row < 0:
+            self.__originY -= self.__pitchY
+            self.__shiftY += 1
+            self.__height += 1
+            row = int(round((y-self.__originY)/self.__pitchY))
+        if row+1 > self.__height:
+            self.__height = row+1
+
+        self.__columns.append(column-self.__shiftX)
+        self.__rows.append(row-self.__shiftY)
+        self.__count += 1
+        self.__built = False
+        if self.__indexItems:
+            return
+
+        # 标准格式的区块指令只保存编号和坐标，其他格式的数据额外保存原始内容
+        index = len(self.__blockN)
+        result = self.__reBlock.match(data) if isinstance(data, str) else None
+        if result:
+            n, blockX, blockY = [int(v) for v in result.groups()]
+        else:
+            n, blockX, blockY = 0, 0, 0
+        try:
+            values = array('l', (n, blockX, blockY))
+        except OverflowError:
+            values = array('l', (0, 0, 0))
+            result = None
+        self.__blockN.append(values[0])
+        self.__blockX.append(values[1])
+        self.__blockY.append(values[2])
+        if not result or data != 'N{0}G1X{1}Y{2}'.format(n, blockX, blockY):
+            self.__texts[index] = data
+
+    def __decode(self, index):
+        """根据区块在数组中的位置还原区块指令，使用fromPositions创建时即为区块的索引"""
+        if self.__indexItems:
+            return index
+        text = self.__texts.get(index)
+        if text is None:
+            text = 'N{0}G1X{1}Y{2}'.format(self.__blockN[index], self.__blockX[index], self.__blockY[index])
+        return text
+
+    def __build(self):
+        """按当前Grid范围重新建立CSR格式的Cell偏移表，Cell中已有区块的顺序保持不变，新增区块排在Cell末尾"""
+        if self.__built:
+            return
+        if self.__order is None:
+            sequence = range(len(self.__columns))
+        else:
+            sequence = []
+            for cell in range(len(self.__starts)):
+                sequence.extend(self.__order[self.__starts[cell]:self.__ends[cell]])
+            sequence.extend(range(self.__builtSize, len(self.__columns)))
+
+        width = max(self.__width, 1)
+        height = max(self.__height, 1)
+        shiftX = self.__shiftX
+        shiftY = self.__shiftY
+        columns = self.__columns
+        rows = self.__rows
+        cells = [(columns[i]+shiftX)*height + rows[i]+shiftY for i in sequence]
+
+        # 计数排序，保持同一Cell中区块的先后顺序
+        starts = array('i', [0]) * (width*height)
+        for cell in cells:
+            starts[cell] += 1
+        total = 0
+        for cell in range(len(starts)):
+            total, starts[cell] = total+starts[cell], total
+        ends = array('i', starts)
+        order = array('i', [0]) * len(cells)
+        columnCounts = array('i', [0]) * width
+        rowCounts = array('i', [0]) * height
+        for i, cell in zip(sequence, cells):
+            order[ends[cell]] = i
+            ends[cell] += 1
+            columnCounts[cell // height] += 1
+            rowCounts[cell % height] += 1
+
+        self.__order = order
+        self.__starts = starts
+        self.__ends = ends
+        self.__columnCounts = columnCounts
+        self.__rowCounts = rowCounts
+        self.__builtSize = len(self.__columns)
+        self.__builtShiftX = shiftX
+        self.__builtShiftY = shiftY
+        self.__builtHeight = height
+        self.__built = True
+
+    def __builtColumn(self, column):
+        """将当前的列索引转换为偏移表中的列索引"""
+        size = max(self.__width, 1)
+        if column < 0:
+            column += size
+        if not 0 <= column < size:
+            raise IndexError('The column index out of grid range')
+        return column - self.__shiftX + self.__builtShiftX
+
+    def __builtRow(self, row):
+        """将当前的行索引转换为偏移表中的行索引"""
+        size = max(self.__height, 1)
+        if row < 0:
+            row += size
+        if not 0 <= row < size:
+            raise IndexError('The row index out of grid range')
+        return row - self.__shiftY + self.__builtShiftY
+
+    def __cell(self, column, row):
+        """返回(column,row)在偏移表中的Cell编号"""
+        self.__build()
+        return self.__builtColumn(column)*self.__builtHeight + self.__builtRow(row)
+
+    def getIndex(self, data):
+        """
+        根据数据的X，Y坐标计算保存在Grid中的索引位置
+        @rtype:tuple(column,row)
+        @raise IndexError:待查询的数据索引超过了当前Grid的界限范围
+        """
+        x, y = self.posParser(data)
+        column = int(round((x-self.__originX)/self.__pitchX))
+        row = int(round((y-self.__originY)/self.__pitchY))
+        if 0 <= column < self.__width and 0 <= row < self.__height:
+            return (column, row)
+        else:
+            raise IndexError('The data index out of grid range')
+
+    def getItems(self, column, row):
+        """
+        根据(column,row)索引返回对应Cell区间中的所有元素
+        注意返回的是新建的list对象，修改该list不会影响Grid中保存的数据
+        @rtype:list
+        @raise IndexError:待查询的数据索引超过了当前Grid的界限范围
+        """
+        cell = self.__cell(column, row)
+        return [self.__decode(i) for i in self.__order[self.__starts[cell]:self.__ends[cell]]]
+
+    def getItem(self, column, row, index):
+        """
+        根据(column,row)索引返回对应Cell区间中index指定的元素
+        @rtype: str
+        @raise IndexError:待查询的数据索引超过了当前Grid的界限范围
+        """
+        cell = self.__cell(column, row)
+        start = self.__starts[cell]
+        count = self.__ends[cell] - start
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError('The item index out of cell range')
+        return self.__decode(self.__order[start+index])
+
+    def popItem(self, column, row, index=-1):
+        """
+        根据(column,row)索引取出指定Cell中index指定的元素，取出Cell首尾元素的复杂度为O(1)
+        @rtype: str
+        @raise IndexError:待查询的数据索引超过了当前Grid的界限范围
+        """
+        cell = self.__cell(column, row)
+        start = self.__starts[cell]
+        end = self.__ends[cell]
+        if index < 0:
+            index += end - start
+        if not 0 <= index < end - start:
+            raise IndexError('The item index out of cell range')
+        item = self.__order[start+index]
+        if index == 0:
+            self.__starts[cell] = start+1
+        else:
+            self.__order[start+index:end-1] = self.__order[start+index+1:end]
+            self.__ends[cell] = end-1
+        self.__count -= 1
+        self.__columnCounts[cell // self.__builtHeight] -= 1
+        self.__rowCounts[cell % self.__builtHeight] -= 1
+        return self.__decode(item)
+
+    def countItems(self, column=None, row=None):
+        """
+        根据(column,row)索引返回对应Cell区间中的元素个数，参数与GridData.countItems相同
+        @rtype:int
+        @raise IndexError:待查询的数据索引超过了当前Grid的界限范围
+        """
+        if column is None and row is None:
+            return self.__count
+        self.__build()
+        if column is None:
+            return self.__rowCounts[self.__builtRow(row)]
+        elif row is None:
+            return self.__columnCounts[self.__builtColumn(column)]
+        else:
+            cell = self.__cell(column, row)
+            return self.__ends[cell] - self.__starts[cell]
+
+    def delAllItems(self):
+        """
+        删除所有保存的数据
+        @return: None
+        """
+        self.__originX = None
+        self.__originY = None
+        self.__shiftX = 0
+        self.__shiftY = 0
+        self.__width = 0
+        self.__height = 0
+        self.__count = 0
+        self.__blockN = array('l')
+        self.__blockX = array('l')
+        self.__blockY = array('l')
+        self.__columns = array('i')
+        self.__rows = array('i')
+        self.__texts = {}
+        self.__built = False
+        self.__builtSize = 0
+        self.__builtShiftX = 0
+        self.__builtShiftY = 0
+        self.__builtHeight = 1
+        self.__order = None
+        self.__starts = None
+        self.__ends = None
+        self.__columnCounts = None
+        self.__rowCounts = None
+
+    def optimizeGrid(self):
+        """
+        删除Grid边缘区域中不包含任何元素的空行、空列，只调整Grid的范围，不移动保存的数据
+        注意Grid中没有任何元素时至少会保留一个空的Cell
+        @return:None
+        """
+        while self.__width > 1 and self.countItems(column=0) == 0:
+            # 删除左侧空列
+            self.__originX += self.__pitchX
+            self.__shiftX -= 1
+            self.__width -= 1
+        while self.__width > 1 and self.countItems(column=self.__width-1) == 0:
+            # 删除右侧空列
+            self.__width -= 1
+        while self.__height > 1 and self.countItems(row=0) == 0:
+            # 删除下方空行
+            self.__originY += self.__pitchY
+            self.__shiftY -= 1
+            self.__height -= 1
+        while self.__height > 1 and self.countItems(row=self.__height-1) == 0:
+            # 删除上方空行
             self.__height -= 1
 
+    def orderCells(self, order):
+        """
+        重新排列每个Cell中区块的先后顺序，参数与GridData.orderCells相同，只调整偏移表中的区块顺序
+        @return: None
+        """
+        self.__build()
+        for cell in range(len(self.__starts)):
+            start = self.__starts[cell]
+            end = self.__ends[cell]
+            if end - start > 1:
+                indexes = self.__order[start:end]
+                self.__order[start:end] = array('i', [indexes[i] for i in order([self.__decode(i) for i in indexes])])
+
     def showGrid(self):
-        print(self.__gridData)
+        print([[self.getItems(c, r) for r in range(self.__height)] for c in range(self.__width)])
+
+
+def cellIndexes(values, pitch):
+    """
+    按照GridData.addItem依次添加数据的方式计算一组坐标值所在的Cell索引
+    以第一个坐标为原点，原点按照addItem向负方向扩充边界的方式逐格移动，保证四舍五入的结果与逐个添加数据时完全一致
+    @param values: 依次添加的数据在X或Y方向上的坐标值
+    @type values: list
+    @param pitch: Cell在该方向上的间隔大小
+    @return: 返回(indexes, origin)，indexes为每个坐标值从0开始的Cell索引，origin为索引0的Cell的原点坐标
+    @rtype: tuple(list, float)
+    """
+    pitch = abs(pitch)
+    origin = values[0]
+    shift = 0
+    indexes = []
+    for v in values:
+        index = int(round((v-origin)/pitch))
+        while index < 0:
+            origin -= pitch
+            shift += 1
+            index = int(round((v-origin)/pitch))
+        indexes.append(index-shift)
+    return [index+shift for index in indexes], origin
 
 
 def parseNumber(s, length=3, lead_zero=False):
@@ -289,7 +846,7 @@ def parseNumber(s, length=3, lead_zero=False):
     @return: 根据文本数据识别出的实际数值
     @rtype: float
     """
-    s = re.sub(r'(^\s+|\s+$)', '', s)
+    s = s.strip()
     if '.' in s:
         return float(s)
     if s[0] == '-':
@@ -315,13 +872,62 @@ def parseBlockXY(s):
     @return: 获取三菱机区块指令中的区块坐标，其中坐标已经转换为象限1(-90度旋转)
     @rtype: tuple(x,y)
     """
-    regBlock = re.compile(r'N\d+G1X(-?\d+)Y(-?\d+)')
-    result = regBlock.match(s)
+    result = regBlockXY.match(s)
     if result:
         BlockX, BlockY = result.groups()
         return (-1*parseNumber(BlockY), parseNumber(BlockX))
 
 
+class PrgLine(object):
+    """钻带中一行指令的解析结果，每行钻带只识别解析一次"""
+    TOOL = 1            # 刀具切换指令，value为刀具编号
+    BLOCK = 2           # 区块指令，value为区块编号，x,y为区块坐标(已转换为象限1)
+    M300 = 3            # 区块加工执行指令
+    GLV = 4             # Glv数据文件切换指令，value为Glv文件编号
+    OTHER = 5           # 其他指令，原样输出
+
+    __slots__ = ('kind', 'text', 'value', 'x', 'y')
+
+    def __init__(self, kind, text, value=None, x=None, y=None):
+        self.kind = kind
+        self.text = text
+        self.value = value
+        self.x = x
+        self.y = y
+
+
+def blockPosition(block):
+    """返回区块指令PrgLine记录的(x,y)坐标，用作GridData的posParser"""
+    return (block.x, block.y)
+
+
+def tokenizePrg(lines, length=3, lead_zero=False):
+    """
+    将钻带内容逐行识别为PrgLine记录的生成器，每行只匹配一次正则表达式，区块坐标的转换方式与parseBlockXY相同
+    @param lines: 钻带内容的行迭代器，每行已删除头尾的空字符
+    @param length: 区块坐标的数据位数长度，参见parseNumber
+    @param lead_zero: 区块坐标是否为前导零格式，参见parseNumber
+    @return: 该函数为生成器函数，每次yield一行钻带的PrgLine记录
+    """
+    match = regLine.match
+    for line in lines:
+        result = match(line)
+        if result is None:
+            if line == 'M300':
+                yield PrgLine(PrgLine.M300, line)
+            else:
+                yield PrgLine(PrgLine.OTHER, line)
+            continue
+        tool, n, blockX, blockY, glv = result.groups()
+        if tool is not None:
+            yield PrgLine(PrgLine.TOOL, line, int(tool))
+        elif n is not None:
+            yield PrgLine(PrgLine.BLOCK, line, int(n), -1*parseNumber(blockY, length, lead_zero),
+                          parseNumber(blockX, length, lead_zero))
+        else:
+            yield PrgLine(PrgLine.GLV, line, int(glv))
+
+
 def optimizeBlockOrder(grid, clockwise=True):
     """
     将GridData中保存的三菱机区块指令按照从外向内加工路径依次输出的生成器
@@ -384,194 +990,3152 @@ def optimizeBlockOrder(grid, clockwise=True):
     grid.delAllItems()
 
 
-def getGlvFileIndex(N, glvFiles):
+def loadNumpy():
     """
-    根据当前区块编号返回区块所在的.glv文件索引
-    @param N: 需要查询所在GLV文件中的区块编号
-    @type N: int
-    @param glvFiles: 保存每个GLV文件启始区块编号的列表，列表的索引编号代表GLV的文件编号，值代表该GLV文件中第一个区块编号
-    @type glvFiles: list
-    @return: 返回区块N所在的GLV文件编号，值为0表示在第一个glv文件，值为1表示在第二个glv文件，依此类推
-    @rtype: int
+    第一次调用时导入NumPy，之后numpyBlockOrder等函数可以直接使用模块变量numpy
+    @return: numpy模块，未安装NumPy时返回None
     """
-    for i in range(len(glvFiles)-1, -1, -1):
-        if N >= glvFiles[i]:
-            return i
+    global numpy, numpyLoaded
+    if not numpyLoaded:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        numpyLoaded = True
+    return numpy
 
 
-def outputBlock(f, gridData, curGlvIndex, glvFiles, isTopSide):
-    """将GridData中的区块按优化后路径保存到文件中"""
-    reBlockN = re.compile(r'N(\d+)G1X-?\d+Y-?\d+')
-    for block in optimizeBlockOrder(grid, isTopSide):
-        N = int(reBlockN.match(block).groups()[0])
-        glvFileIndex = getGlvFileIndex(N, glvFiles)
-        if curGlvIndex != glvFileIndex:
-            curGlvIndex = glvFileIndex
-            f.write('M9'+str(curGlvIndex).zfill(2)+'\n')
-        f.write(block+'\n')
-        f.write('M300\n')
-    return curGlvIndex
-
+def numpyCellIndexes(values, pitch):
+    """
+    使用NumPy计算一组坐标值所在的Cell索引，结果与cellIndexes相同
+    坐标恰好位于Cell边界时四舍五入的结果与原点的移动方式有关，这些坐标以及会使原点移动的坐标按照cellIndexes的方式逐个计算
+    @param values: 依次添加的数据在X或Y方向上的坐标值
+    @type values: numpy.ndarray
+    @param pitch: Cell在该方向上的间隔大小
+    @return: 每个坐标值从0开始的Cell索引
+    @rtype: numpy.ndarray
+    """
+    pitch = abs(pitch)
+    offsets = (values-values[0])/pitch
+    indexes = numpy.round(offsets).astype(numpy.int64)
+    ties = numpy.abs(offsets-numpy.floor(offsets)-0.5) < 1e-6
+    # 只有边界上的坐标以及小于之前所有非边界坐标索引的坐标可能改变原点位置
+    previousMin = numpy.minimum.accumulate(numpy.concatenate(([0], numpy.where(ties, 0, indexes)[:-1])))
+    origin = values[0]
+    shift = 0
+    for i in numpy.nonzero(ties | (indexes < previousMin))[0].tolist():
+        v = float(values[i])
+        index = int(round((v-origin)/pitch))
+        while index < 0:
+            origin -= pitch
+            shift += 1
+            index = int(round((v-origin)/pitch))
+        indexes[i] = index-shift
+    return indexes - indexes.min()
 
-def encode(s, encoding='gbk'):
-    """对于Python2.x需在Windows环境下将文本编码转换为GBK"""
-    if sys.version_info[0] == 2:
-        return s.encode('gbk')
-    else:
-        return s
 
+def numpyBlockOrder(positions, pitchX, pitchY, clockwise=True, cellOrder=None):
+    """
+    使用NumPy一次性计算全部区块从外向内的加工顺序，结果与optimizeBlockOrder输出的顺序完全一致
+    每个区块的排序键为(所在回形路径的层数, 在Cell中的先后顺序, 在回形路径上的位置)，
+    其中每一层回形路径为剩余区块所在Cell的外接矩形的边框，与optimizeBlockOrder中optimizeGrid裁剪后的Grid边缘相同
+    @param positions: 按添加顺序排列的区块(x,y)坐标列表
+    @type positions: list
+    @param pitchX: Cell在X方向上的间隔大小
+    @param pitchY: Cell在Y方向上的间隔大小
+    @param clockwise: 值为True时从左下角按顺时针输出，值为False时从右下角按逆时针输出
+    @param cellOrder: Cell中区块先后顺序的排序函数，参数与GridData.orderCells相同(元素为区块索引)，为None时按添加顺序
+    @return: 按加工顺序排列的区块索引数组
+    @rtype: numpy.ndarray
+    @raise ImportError: 未安装NumPy
+    """
+    if loadNumpy() is None:
+        raise ImportError('No module named numpy')
+    if not positions:
+        return numpy.zeros(0, dtype=numpy.int64)
+    coords = numpy.array(positions, dtype=float)
+    columns = numpyCellIndexes(coords[:, 0], pitchX)
+    rows = numpyCellIndexes(coords[:, 1], pitchY)
 
-def checkPrg(isTopSide, prg):
-    """检查镭射钻带是否满足要求"""
-    # 判断是否为三菱机加工钻带
-    if prg[0] != '%':
-        print(encode('加工钻带无法识别，请确认是否为三菱机加工钻带。'))
-        return False
+    # 每个Cell中的区块按添加顺序依次在每一圈路径中取出一个
+    cells, inverse = numpy.unique(columns*(rows.max()+1) + rows, return_inverse=True)
+    inverse = inverse.ravel()
+    stable = numpy.argsort(inverse, kind='mergesort')
+    sortedCells = inverse[stable]
+    firsts = numpy.searchsorted(sortedCells, sortedCells)
+    if cellOrder is not None:
+        # 按cellOrder重新排列每个Cell中区块的先后顺序，与GridData.orderCells相同
+        bounds = numpy.flatnonzero(numpy.diff(sortedCells)).tolist()
+        ordered = stable.tolist()
+        for start, end in zip([0]+[b+1 for b in bounds], [b+1 for b in bounds]+[len(ordered)]):
+            if end - start > 1:
+                indexes = ordered[start:end]
+                ordered[start:end] = [indexes[i] for i in cellOrder(indexes)]
+        stable = numpy.array(ordered, dtype=numpy.int64)
+    passes = numpy.empty(len(inverse), dtype=numpy.int64)
+    passes[stable] = numpy.arange(len(inverse)) - firsts
 
-    # 判断是否使用回形加工转换
-    if '(BEST DIVISION:SP1_DIV)' not in prg:
-        print(encode('请使用SP1_DIV回形加工方法转换钻带!'))
-        return False
+    # 逐层计算剩余Cell外接矩形边框上的Cell所在的层数及其在路径上的位置
+    cellColumns = cells // (rows.max()+1)
+    cellRows = cells % (rows.max()+1)
+    depths = numpy.zeros(len(cells), dtype=numpy.int64)
+    steps = numpy.zeros(len(cells), dtype=numpy.int64)
+    remaining = numpy.arange(len(cells))
+    depth = 0
+    while len(remaining):
+        x = cellColumns[remaining]
+        y = cellRows[remaining]
+        minX, maxX, minY, maxY = x.min(), x.max(), y.min(), y.max()
+        w = maxX - minX
+        h = maxY - minY
+        if w == 0 or h == 0:
+            # 只有单行和单列时逐行输出
+            edge = numpy.ones(len(remaining), dtype=bool)
+            if clockwise:
+                step = (y-minY)*(w+1) + (x-minX)
+            else:
+                step = (y-minY)*(w+1) + (maxX-x)
+        else:
+            edge = (x == minX) | (x == maxX) | (y == minY) | (y == maxY)
+            if clockwise:
+                # 左侧由下向上，上方由左向右，右侧由上向下，下方由右向左
+                step = numpy.select(
+                    [(x == minX) & (y < maxY), (y == maxY) & (x < maxX), (x == maxX) & (y > minY)],
+                    [y-minY, h+x-minX, h+w+maxY-y], 2*h+w+maxX-x)
+            else:
+                # 右侧由下向上，上方由右向左，左侧由上向下，下方由左向右
+                step = numpy.select(
+                    [(x == maxX) & (y < maxY), (y == maxY) & (x > minX), (x == minX) & (y > minY)],
+                    [y-minY, h+maxX-x, h+w+maxY-y], 2*h+w+x-minX)
+        depths[remaining[edge]] = depth
+        steps[remaining[edge]] = step[edge]
+        remaining = remaining[~edge]
+        depth += 1
 
-    # 判断扫描区域大小设置是否为30mm*30mm
-    if '(Area:X=30.000,Y=30.000)' not in prg:
-        print(encode('请使用30mm*30mm扫描区域大小转换钻带!'))
-        return False
+    return numpy.lexsort((steps[inverse], passes, depths[inverse]))
 
-    # 判断正面是否关闭X-Mirror进行转换
-    if isTopSide and '(X MIRROR:ON)' in prg:
-        print(encode('正面钻带需关闭X Mirror设置进行转换!'))
-        return False
 
-    # 判断反面是否有使用X-Mirror转换
-    if (not isTopSide) and '(X MIRROR:OFF)' in prg:
-        print(encode('反面钻带需使用X Mirror设置进行转换!'))
-        return False
+def sortBlocks(items, pitchX, pitchY, clockwise=True, posParser=parseBlockXY):
+    """
+    将区块按照从外向内的加工路径排序，使用blockOrder计算加工顺序
+    @param items: 按原始顺序排列的区块指令列表
+    @type items: list
+    @param pitchX: Cell在X方向上的间隔大小
+    @param pitchY: Cell在Y方向上的间隔大小
+    @param clockwise: 值为True时从左下角按顺时针输出，值为False时从右下角按逆时针输出
+    @param posParser: 区块指令的X,Y坐标解析器函数
+    @return: 按加工顺序排列的区块指令列表
+    @rtype: list
+    """
+    return [items[i] for i in blockOrder([posParser(data) for data in items], pitchX, pitchY, clockwise)]
 
-    # 判断镭射钻带是否已经优化过加工路径
-    if '(Drilling Path Optimized)' in prg:
-        print(encode('加工钻带已经优化过加工路径!'))
-        return False
-    
-    return True
 
-if __name__ == '__main__':
-    hasArgv=False
-    if len(sys.argv) > 1:
-        hasArgv=True
-        filePath = sys.argv[1]
-    while True:
-        # 获取钻带文件名
-        if hasArgv:
-            hasArgv=False
+def blockOrder(positions, pitchX, pitchY, clockwise=True, phases=None, subPitch=None, compact=False):
+    """
+    计算区块从外向内的加工顺序，区块数不少于NUMPY_MIN_BLOCKS或已经导入NumPy时使用numpyBlockOrder，
+    否则使用GridData及optimizeBlockOrder，两者的结果完全相同
+    @param positions: 按原始顺序排列的区块(x,y)坐标列表
+    @type positions: list
+    @param phases: 不为None时将建立GridData的耗时累计至phases['grid']
+    @param subPitch: Cell内子Grid在X,Y方向上的间隔(pitchX, pitchY)，不为None时每个Cell中的区块也按子Grid中从外向内的
+                     回形路径依次取出，为None时按原始顺序取出
+    @param compact: 不使用NumPy时是否以CompactGridData代替GridData，结果相同但占用的内存更少
+    @return: 按加工顺序排列的区块索引列表
+    @rtype: list
+    """
+    cellOrder = None
+    if subPitch is not None:
+        def cellOrder(indexes):
+            return blockOrder([positions[i] for i in indexes], subPitch[0], subPitch[1], clockwise, compact=compact)
+    if numpy is None and (numpyLoaded or len(positions) < NUMPY_MIN_BLOCKS or loadNumpy() is None):
+        start = time.time()
+        if compact:
+            grid = CompactGridData.fromPositions(positions, pitchX, pitchY)
         else:
-            filePath = input(encode('请输入钻带程序名：'))
-        if not filePath:
-            sys.exit(0)
-        name, ext = os.path.splitext(filePath)
-        ext = '.prg'
-        if not os.path.isfile(name+ext):
-            print(encode('钻带程序未找到: '+name+ext+'\n'))
-            continue
+            grid = GridData.fromItems(range(len(positions)), pitchX, pitchY, lambda i: positions[i])
+        if cellOrder is not None:
+            grid.orderCells(cellOrder)
+        if phases is not None:
+            phases['grid'] += time.time() - start
+        return list(optimizeBlockOrder(grid, clockwise))
+    return numpyBlockOrder(positions, pitchX, pitchY, clockwise, cellOrder).tolist()
 
-        # 从钻带文件名中判断钻带的面次
-        isTopSide = re.search(r'lsr(\d\d)(\d\d)', name)
-        if isTopSide:
-            isTopSide = isTopSide.groups()
+
+def ringDepths(positions, pitchX, pitchY):
+    """
+    计算每个区块在从外向内加工路径中所在回形路径的层数，最外层为0
+    每一层回形路径为剩余区块所在Cell的外接矩形的边框，与optimizeBlockOrder中的每一圈路径相同
+    @param positions: 按原始顺序排列的区块(x,y)坐标列表
+    @type positions: list
+    @return: 每个区块所在的层数
+    @rtype: list
+    """
+    if not positions:
+        return []
+    columns = cellIndexes([p[0] for p in positions], pitchX)[0]
+    rows = cellIndexes([p[1] for p in positions], pitchY)[0]
+    remaining = set(zip(columns, rows))
+    cellDepths = {}
+    depth = 0
+    while remaining:
+        minX = min(c for c, r in remaining)
+        maxX = max(c for c, r in remaining)
+        minY = min(r for c, r in remaining)
+        maxY = max(r for c, r in remaining)
+        edge = [cell for cell in remaining if cell[0] in (minX, maxX) or cell[1] in (minY, maxY)]
+        for cell in edge:
+            cellDepths[cell] = depth
+        remaining.difference_update(edge)
+        depth += 1
+    return [cellDepths[cell] for cell in zip(columns, rows)]
+
+
+def groupGlvOrder(order, depths, glvIndexes, curGlvIndex, window=1):
+    """
+    在保持从外向内加工顺序的前提下，将每window层回形路径中的区块按GLV文件分组输出，以减少M90x切换GLV文件的次数
+    每组中区块的先后顺序保持不变，第一组优先使用当前的GLV文件，最后一组优先使用下一个分组窗口中出现的GLV文件
+    @param order: 按加工顺序排列的区块索引列表，同一层的区块必须连续排列
+    @param depths: 每个区块所在回形路径的层数
+    @param glvIndexes: 每个区块所在的GLV文件编号
+    @param curGlvIndex: 输出第一个区块前的GLV文件编号
+    @param window: 每个分组窗口包含的回形路径层数
+    @return: 调整后的区块索引列表
+    @rtype: list
+    """
+    # 按分组窗口划分区块，窗口中按GLV文件首次出现的顺序分组
+    windows = []
+    for i in order:
+        key = depths[i] // window
+        if not windows or windows[-1][0] != key:
+            windows.append((key, [], {}))
+        keys, groups = windows[-1][1], windows[-1][2]
+        glv = glvIndexes[i]
+        if glv not in groups:
+            keys.append(glv)
+            groups[glv] = []
+        groups[glv].append(i)
+
+    result = []
+    for w, (key, keys, groups) in enumerate(windows):
+        keys = list(keys)
+        if curGlvIndex in groups:
+            keys.remove(curGlvIndex)
+            keys.insert(0, curGlvIndex)
+        if w+1 < len(windows) and len(keys) > 1:
+            for glv in windows[w+1][1]:
+                if glv in keys[1:]:
+                    keys.remove(glv)
+                    keys.append(glv)
+                    break
+        for glv in keys:
+            result.extend(groups[glv])
+        curGlvIndex = keys[-1]
+    return result
+
+
+def countGlvSwitches(glvIndexes, curGlvIndex):
+    """
+    统计依次输出区块时需要插入M90x指令切换GLV文件的次数
+    @param glvIndexes: 按输出顺序排列的区块所在GLV文件编号
+    @param curGlvIndex: 输出第一个区块前的GLV文件编号
+    @return: 返回(切换次数, 最后一个区块的GLV文件编号)
+    @rtype: tuple(int, int)
+    """
+    switches = 0
+    for glv in glvIndexes:
+        if glv != curGlvIndex:
+            switches += 1
+            curGlvIndex = glv
+    return switches, curGlvIndex
+
+
+def pathLength(positions, order, start=None):
+    """
+    计算依次移动至各区块的平台移动距离
+    @param positions: 区块的(x,y)坐标列表
+    @param order: 区块的移动顺序
+    @param start: 移动的起始坐标，为None时从第一个区块开始
+    @return: 移动距离，单位与坐标相同
+    @rtype: float
+    """
+    length = 0.0
+    previous = start
+    for i in order:
+        point = positions[i]
+        if previous is not None:
+            length += math.hypot(point[0]-previous[0], point[1]-previous[1])
+        previous = point
+    return length
+
+
+class PointIndex(object):
+    """将坐标点按固定间隔分桶保存的空间索引，用于查找距离最近的点"""
+
+    def __init__(self, positions, indexes=None):
+        """
+        初始化PointIndex对象.
+        @param positions: 坐标点的(x,y)列表
+        @param indexes: 需要加入索引的坐标点编号，为None时加入全部坐标点
+        @return:None
+        """
+        if indexes is None:
+            indexes = range(len(positions))
+        indexes = list(indexes)
+        self.__positions = positions
+        self.__count = len(indexes)
+        if not indexes:
+            self.__minX = self.__minY = 0.0
+            self.__size = 1.0
+            self.__radius = 0
+            self.__buckets = {}
+            return
+        xs = [positions[i][0] for i in indexes]
+        ys = [positions[i][1] for i in indexes]
+        self.__minX = min(xs)
+        self.__minY = min(ys)
+        width = max(xs) - self.__minX
+        height = max(ys) - self.__minY
+        # 每个桶中平均约2个坐标点，桶的编号范围为0~radius
+        self.__size = math.sqrt(max(width*height, width*width, height*height) * 2.0 / len(indexes)) or 1.0
+        self.__radius = int(max(width, height) / self.__size)
+        self.__buckets = {}
+        for i in indexes:
+            self.__buckets.setdefault(self.__bucket(positions[i]), set()).add(i)
+
+    def __len__(self):
+        return self.__count
+
+    def __bucket(self, point):
+        """返回坐标点所在桶的编号"""
+        return (int((point[0]-self.__minX) // self.__size), int((point[1]-self.__minY) // self.__size))
+
+    def remove(self, i):
+        """
+        从索引中删除坐标点
+        @param i: 坐标点编号
+        @return: None
+        """
+        bucket = self.__buckets[self.__bucket(self.__positions[i])]
+        bucket.remove(i)
+        self.__count -= 1
+
+    def nearest(self, point, k=1, exclude=None):
+        """
+        查找距离point最近的k个坐标点，距离相同时编号小的坐标点优先
+        @param point: 查询的(x,y)坐标
+        @param k: 需要返回的坐标点个数
+        @param exclude: 不需要返回的坐标点编号
+        @return: 按距离由近至远排列的坐标点编号列表
+        @rtype: list
+        """
+        positions = self.__positions
+        buckets = self.__buckets
+        R = self.__radius
+        bx, by = self.__bucket(point)
+        found = []
+        # 从包含索引范围内的桶的第一圈开始，依次检查与中心桶距离为r的一圈桶
+        r = max(0, -bx, bx-R, -by, by-R)
+        while r <= max(abs(bx), abs(bx-R), abs(by), abs(by-R)):
+            ring = []
+            for y in (by-r, by+r):
+                if 0 <= y <= R:
+                    ring.extend((x, y) for x in range(max(bx-r, 0), min(bx+r, R)+1))
+                if r == 0:
+                    break
+            for x in (bx-r, bx+r):
+                if 0 <= x <= R and r > 0:
+                    ring.extend((x, y) for y in range(max(by-r+1, 0), min(by+r-1, R)+1))
+            for key in ring:
+                for i in buckets.get(key, ()):
+                    if i != exclude:
+                        p = positions[i]
+                        found.append((math.hypot(p[0]-point[0], p[1]-point[1]), i))
+            # 下一圈桶中的坐标点距离不小于r*size，已找到的k个坐标点不会再被替换
+            if len(found) >= k:
+                found.sort()
+                del found[k:]
+                if found[-1][0] <= r * self.__size:
+                    break
+            r += 1
+        found.sort()
+        return [i for d, i in found[:k]]
+
+
+def nearestNeighbourPath(positions, indexes, start, deadline=None):
+    """
+    最近邻算法：从start出发每次移动至距离最近的未加工区块
+    @param positions: 区块的(x,y)坐标列表
+    @param indexes: 需要排列的区块编号列表
+    @param start: 起始的(x,y)坐标
+    @param deadline: 计算时间的截止时刻，最近邻算法总是完成全部计算
+    @return: 排列后的区块编号列表
+    @rtype: list
+    """
+    index = PointIndex(positions, indexes)
+    path = []
+    point = start
+    while len(index):
+        i = index.nearest(point)[0]
+        index.remove(i)
+        path.append(i)
+        point = positions[i]
+    return path
+
+
+def twoOptPath(positions, indexes, start, deadline=None, neighbours=8):
+    """
+    先使用最近邻算法生成路径，再使用基于近邻列表的2-opt算法反转路径片段缩短移动距离，直至无法改进或到达截止时刻
+    @param positions: 区块的(x,y)坐标列表
+    @param indexes: 需要排列的区块编号列表
+    @param start: 起始的(x,y)坐标，路径的起点固定，终点不需要返回起点
+    @param deadline: 计算时间的截止时刻(time.time())，为None时不限制计算时间
+    @param neighbours: 每个区块参与2-opt交换的近邻区块个数
+    @return: 排列后的区块编号列表
+    @rtype: list
+    """
+    path = nearestNeighbourPath(positions, indexes, start)
+    n = len(path)
+    if n < 3:
+        return path
+    index = PointIndex(positions, path)
+    candidates = dict((i, index.nearest(positions[i], neighbours, i)) for i in path)
+    candidates[None] = index.nearest(start, neighbours)
+    pos = dict((i, p) for p, i in enumerate(path))
+
+    def point(p):
+        return start if p < 0 else positions[path[p]]
+
+    def dist(a, b):
+        return math.hypot(a[0]-b[0], a[1]-b[1])
+
+    improved = True
+    while improved:
+        improved = False
+        for p in range(n):
+            if deadline is not None and time.time() > deadline:
+                return path
+            # 将路径片段path[p..q]反转：边(p-1,p)与(q,q+1)替换为(p-1,q)与(p,q+1)
+            a = point(p-1)
+            b = point(p)
+            for c in candidates[path[p-1] if p > 0 else None]:
+                q = pos[c]
+                if q <= p:
+                    continue
+                qc = positions[c]
+                delta = dist(a, qc) - dist(a, b)
+                if q+1 < n:
+                    d = point(q+1)
+                    delta += dist(b, d) - dist(qc, d)
+                if delta < -1e-9:
+                    path[p:q+1] = path[p:q+1][::-1]
+                    for r in range(p, q+1):
+                        pos[path[r]] = r
+                    improved = True
+                    break
+    return path
+
+
+# 缩短平台移动距离的算法，函数参数为(positions, indexes, start, deadline)，返回排列后的区块编号列表
+travelHeuristics = {
+    'nn': nearestNeighbourPath,
+    '2opt': twoOptPath,
+}
+
+
+def travelOrder(order, depths, positions, heuristic, deadline=None, start=None):
+    """
+    在保持从外向内加工顺序的前提下，将每层回形路径中的区块重新排列以缩短平台移动距离
+    @param order: 按加工顺序排列的区块索引列表，同一层的区块必须连续排列
+    @param depths: 每个区块所在回形路径的层数
+    @param positions: 每个区块的(x,y)坐标
+    @param heuristic: travelHeuristics中的算法函数
+    @param deadline: 计算时间的截止时刻，超时后剩余的回形路径只使用最近邻算法
+    @param start: 平台的起始坐标，为None时从第一个区块开始
+    @return: 调整后的区块索引列表
+    @rtype: list
+    """
+    result = []
+    ring = []
+    if start is None and order:
+        start = positions[order[0]]
+    for k, i in enumerate(order):
+        ring.append(i)
+        if k+1 == len(order) or depths[order[k+1]] != depths[i]:
+            if deadline is not None and time.time() > deadline:
+                path = nearestNeighbourPath(positions, ring, start)
+            else:
+                path = heuristic(positions, ring, start, deadline)
+            result.extend(path)
+            start = positions[path[-1]]
+            ring = []
+    return result
+
+
+def getGlvFileIndex(N, glvFiles):
+    """
+    根据当前区块编号返回区块所在的.glv文件索引
+    @param N: 需要查询所在GLV文件中的区块编号
+    @type N: int
+    @param glvFiles: 保存每个GLV文件启始区块编号的列表，列表的索引编号代表GLV的文件编号，值代表该GLV文件中第一个区块编号
+    @type glvFiles: list
+    @return: 返回区块N所在的GLV文件编号，值为0表示在第一个glv文件，值为1表示在第二个glv文件，依此类推
+    @rtype: int
+    """
+    for i in range(len(glvFiles)-1, -1, -1):
+        if N >= glvFiles[i]:
+            return i
+
+
+class GlvFileIndex(object):
+    """
+    保存每个GLV文件起始区块编号的索引，查询结果与getGlvFileIndex相同
+    查询时对起始区块编号的后缀最小值表进行二分查找，并缓存最近一次查询所在的区块编号区间，同一区块组中的区块编号大多连续，
+    多数查询不需要二分查找；只缓存一个区间，占用的内存不随钻带大小增加，GLV文件的起始区块编号变化时清除缓存
+    """
+
+    def __init__(self):
+        self.__starts = [1]         # 每个GLV文件中的起始区块编号，未识别起始区块的GLV文件为999999
+        self.__bounds = None        # 起始区块编号的后缀最小值，单调不减，可用于二分查找
+        self.__range = (0, 0, None)  # 最近一次查询所在的区块编号区间[lo, hi)及其GLV文件编号
+
+    @classmethod
+    def fromStarts(cls, starts):
+        """
+        根据starts属性返回的起始区块编号列表重建GlvFileIndex，用于从检查点恢复处理进度
+        @param starts: 每个GLV文件起始区块编号的列表
+        @return: GlvFileIndex对象
+        """
+        index = cls()
+        index.__starts = list(starts)
+        return index
+
+    @property
+    def starts(self):
+        """
+        只读属性，返回每个GLV文件起始区块编号的列表，与getGlvFileIndex使用的glvFiles列表相同
+        @rtype: list
+        """
+        return list(self.__starts)
+
+    def addFile(self, index):
+        """
+        识别到M90x指令时增加GLV文件，新增的GLV文件起始区块编号为999999
+        @param index: GLV文件编号
+        @type index: int
+        @return: None
+        """
+        if index >= len(self.__starts):
+            while index >= len(self.__starts):
+                self.__starts.append(999999)
+            self.__bounds = None
+            self.__range = (0, 0, None)
+
+    def setStart(self, index, N):
+        """
+        更新GLV文件的起始区块编号，只有N小于当前的起始区块编号时才更新
+        @param index: GLV文件编号
+        @param N: GLV文件中的区块编号
+        @return: None
+        """
+        if N < self.__starts[index]:
+            self.__starts[index] = N
+            self.__bounds = None
+            self.__range = (0, 0, None)
+
+    def lookup(self, N):
+        """
+        返回区块N所在的GLV文件编号
+        满足glvFiles[i]<=N的最大索引i与满足后缀最小值bounds[i]<=N的最大索引相同，因此可以对bounds二分查找
+        @param N: 区块编号
+        @type N: int
+        @return: 区块N所在的GLV文件编号，区块编号小于所有GLV文件的起始区块编号时返回None
+        @rtype: int or None
+        """
+        lo, hi, index = self.__range
+        if lo <= N < hi:
+            return index
+        bounds = self.__bounds
+        if bounds is None:
+            bounds = list(self.__starts)
+            for i in range(len(bounds)-2, -1, -1):
+                bounds[i] = min(bounds[i], bounds[i+1])
+            self.__bounds = bounds
+        index = bisect.bisect_right(bounds, N) - 1
+        # 区块编号在[bounds[index], bounds[index+1])区间内时查询结果相同
+        hi = bounds[index+1] if index+1 < len(bounds) else float('inf')
+        if index < 0:
+            self.__range = (float('-inf'), hi, None)
+            return None
+        self.__range = (bounds[index], hi, index)
+        return index
+
+
+class OptimizeOptions(object):
+    """钻带路径优化的可选设置，默认设置与原有的回形路径输出结果完全相同"""
+
+    def __init__(self, glvWindow=0, travel=None, travelTime=None, stageSpeed=300.0, dwell=0.05, metrics=True,
+                 cacheDir=None, cacheSize=256, checkpoint=None, segmentWorkers=1, previousDir=None, area=None,
+                 machine=None, subGrid=None, glvSwitchTime=0.5, compactGrid=False,
+                 segmentIndex=False):
+        """
+        初始化OptimizeOptions对象.
+        @param glvWindow: 大于0时将每glvWindow层回形路径中的区块按GLV文件分组输出，为0时不分组
+        @param travel: 缩短平台移动距离的算法名称(travelHeuristics中的键值)，为None时不调整每层回形路径中的区块顺序
+        @param travelTime: 每个钻带计算移动路径的时间限制(秒)，为None时不限制
+        @param stageSpeed: 平台的平均移动速度(mm/s)，用于估算节省的加工时间
+        @param dwell: 每个M300区块加工指令的停留时间(秒)，用于估算加工时间
+        @param metrics: 是否在钻带旁保存.metrics.json统计文件
+        @param cacheDir: 保存优化结果缓存的目录，为None时不使用缓存
+        @param cacheSize: 缓存的最大容量(MB)，超过时删除最久未使用的结果
+        @param checkpoint: 保存处理进度检查点的间隔时间(秒)，为None或0时不保存检查点
+        @param segmentWorkers: 并行计算每个钻带中各区块组顺序的进程数，为1时在当前进程中计算
+        @param previousDir: 上一次优化结果所在的目录，其中有同名钻带的.segments索引文件时，未修改的区块组直接使用之前的顺序
+        @param area: 扫描区域在X,Y方向上的大小(mm)，用作划分回形路径的Cell间隔，为None时使用钻带程式头中的设置
+        @param machine: 镭射机的钻带格式设置，machineProfiles中的名称或JSON文件路径，为None时使用default
+        @param subGrid: Cell内子Grid在X,Y方向上的大小(mm)，不为None时每个Cell中的区块按子Grid的回形路径依次加工，
+                        为None时按钻带中的原始顺序
+        @param glvSwitchTime: 每次M90x切换GLV文件的耗时(秒)，用于估算加工时间，缩短移动距离的同时增加的切换次数也计入
+        @param compactGrid: 不使用NumPy计算回形路径时是否以CompactGridData代替GridData，输出结果相同但占用的内存更少
+        @param segmentIndex: 是否在钻带旁保存供增量优化使用的.segments索引文件，设置了previousDir时总是保存
+        @return:None
+        @raise ValueError: 移动路径算法名称或镭射机设置不正确
+        """
+        if travel is not None and travel not in travelHeuristics:
+            raise ValueError('Unknown travel heuristic: '+str(travel))
+        profile = loadMachineProfile(machine)
+        self.glvWindow = glvWindow
+        self.travel = travel
+        self.travelTime = travelTime
+        self.stageSpeed = stageSpeed
+        self.dwell = dwell
+        self.metrics = metrics
+        self.cacheDir = cacheDir
+        self.cacheSize = cacheSize
+        self.checkpoint = checkpoint
+        self.segmentWorkers = segmentWorkers
+        self.previousDir = previousDir
+        self.area = tuple(area) if area is not None else None
+        self.machine = machine
+        self.numberLength = profile['numberLength']
+        self.leadZero = profile['leadZero']
+        self.defaultArea = tuple(profile['area']) if profile.get('area') else None
+        self.subGrid = tuple(subGrid) if subGrid is not None else None
+        self.glvSwitchTime = glvSwitchTime
+        self.compactGrid = compactGrid
+        self.segmentIndex = segmentIndex
+
+    def forProgram(self, prg):
+        """
+        返回用于钻带的设置，没有指定扫描区域大小时使用程式头中的设置，程式头中也没有时使用镭射机设置中的大小，均没有时使用DEFAULT_AREA
+        @param prg: 钻带程式头的行列表
+        @return: 设置了area的OptimizeOptions对象
+        @rtype: OptimizeOptions
+        """
+        if self.area is not None:
+            return self
+        options = copy.copy(self)
+        options.area = scanArea(prg) or self.defaultArea
+        return options
+
+    def gridPitch(self):
+        """
+        返回区块坐标在X,Y方向上的Cell间隔，区块坐标已经旋转-90度转换为象限1，X方向的间隔为扫描区域在Y方向上的大小
+        @return: (pitchX, pitchY)
+        @rtype: tuple
+        """
+        areaX, areaY = self.area or self.defaultArea or DEFAULT_AREA
+        return areaY, areaX
+
+    def subGridPitch(self):
+        """
+        返回Cell内子Grid在区块坐标X,Y方向上的间隔，与gridPitch相同交换X,Y方向，没有设置子Grid时返回None
+        @return: (pitchX, pitchY)或None
+        @rtype: tuple
+        """
+        if self.subGrid is None:
+            return None
+        return self.subGrid[1], self.subGrid[0]
+
+    def cycleTime(self, travel, blocks, glvSwitches=0):
+        """
+        估算加工时间：平台移动时间、每个区块的M300停留时间及M90x切换GLV文件的时间之和
+        @param travel: 平台移动距离(mm)
+        @param blocks: 区块数量
+        @param glvSwitches: GLV文件切换次数
+        @return: 估算的加工时间(秒)
+        @rtype: float
+        """
+        return travel / self.stageSpeed + blocks * self.dwell + glvSwitches * self.glvSwitchTime
+
+    def deadline(self):
+        """返回从当前时刻开始计算移动路径的截止时刻，没有时间限制时返回None"""
+        if self.travelTime is None:
+            return None
+        return time.time() + self.travelTime
+
+
+def loadMachineProfile(machine=None):
+    """
+    读取镭射机的钻带格式设置，JSON文件中没有的设置使用default中的设置
+    @param machine: machineProfiles中的名称或JSON文件路径，为None时使用default
+    @return: 包含numberLength、leadZero及area的字典
+    @rtype: dict
+    @raise ValueError: 没有该名称的设置，或者JSON文件不存在
+    """
+    if machine is None:
+        machine = 'default'
+    if machine in machineProfiles:
+        return machineProfiles[machine]
+    if not os.path.isfile(machine):
+        raise ValueError('Unknown machine profile: '+str(machine))
+    profile = dict(machineProfiles['default'])
+    with open(machine) as f:
+        profile.update(json.load(f))
+    return profile
+
+
+def scanArea(prg):
+    """
+    从钻带程式头的(Area:X=30.000,Y=30.000)设置中识别扫描区域的大小
+    @param prg: 钻带程式头的行列表
+    @return: 扫描区域在X,Y方向上的大小(mm)，没有设置时返回None
+    @rtype: tuple(float, float) or None
+    """
+    for line in prg:
+        result = regArea.match(line)
+        if result:
+            area = (float(result.group(1)), float(result.group(2)))
+            if area[0] > 0 and area[1] > 0:
+                return area
+    return None
+
+
+def processPool(workers):
+    """
+    创建进程池，第一次使用时才导入concurrent.futures
+    @param workers: 进程数
+    @return: ProcessPoolExecutor对象，Python2中没有concurrent.futures时返回None
+    """
+    try:
+        from concurrent.futures import ProcessPoolExecutor
+    except ImportError:
+        return None
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def segmentOrder(positions, isTopSide, options, deadline=None, measure=False):
+    """
+    计算一组区块(一次outputBlock输出的区块)的回形路径顺序，以及在每层回形路径内缩短平台移动距离后的顺序
+    计算结果不依赖其他区块组及GLV文件，可以在子进程中并行计算
+    @param positions: 按原始顺序排列的区块(x,y)坐标列表
+    @param isTopSide: 是否为正面钻带
+    @param options: OptimizeOptions设置
+    @param deadline: 计算移动路径的截止时刻，为None时不限制
+    @param measure: 是否计算回形路径层数及各顺序的平台移动距离
+    @return: 返回(spiral, depths, order, lengths, gridTime, orderTime)，spiral为原有回形路径顺序，measure为True
+             时不使用子Grid，作为统计节省效果的基准；depths为每个区块所在回形路径的层数(不需要时为None)，order为
+             输出的顺序(使用子Grid及缩短移动距离后)，lengths为原始顺序、spiral及order的平台移动距离(measure为False时
+             为None，order与spiral相同时order的距离为None)，gridTime及orderTime为建立GridData及计算顺序的耗时
+    @rtype: tuple
+    """
+    phases = {'grid': 0.0}
+    start = time.time()
+    pitchX, pitchY = options.gridPitch()
+    spiral = blockOrder(positions, pitchX, pitchY, isTopSide, phases, options.subGridPitch(), options.compactGrid)
+    baseline = spiral
+    if measure and options.subGrid is not None:
+        # 使用子Grid时的节省效果以不使用子Grid的原有回形路径为基准
+        baseline = blockOrder(positions, pitchX, pitchY, isTopSide, phases, compact=options.compactGrid)
+    depths = None
+    if options.glvWindow or options.travel or measure:
+        depths = ringDepths(positions, pitchX, pitchY)
+    order = spiral
+    if options.travel:
+        # 先在每层回形路径内缩短平台移动距离，再按GLV文件分组时每组内仍保持该顺序
+        order = travelOrder(spiral, depths, positions, travelHeuristics[options.travel], deadline)
+    lengths = None
+    if measure:
+        lengths = (pathLength(positions, range(len(positions))), pathLength(positions, baseline),
+                   pathLength(positions, order) if order is not baseline else None)
+    return baseline, depths, order, lengths, phases['grid'], time.time() - start - phases['grid']
+
+
+def blockOutputOrder(blocks, curGlvIndex, glvIndexes, isTopSide, stats=None, options=None, deadline=None,
+                     segment=None):
+    """
+    计算区块的输出顺序，参数与outputBlock相同
+    @param blocks: 当前刀具中区块指令的PrgLine记录列表
+    @param glvIndexes: 每个区块所在的GLV文件编号
+    @param stats: 不为None时累计输出的区块数blocks、位置发生变化的区块数moved、GLV文件切换次数glvSwitches、
+                  平台移动距离travel、回形路径层数rings，以及按原始顺序(original前缀)和按原有回形路径(spiral前缀)
+                  输出时的GLV文件切换次数及平台移动距离，originalGlvIndex及spiralGlvIndex保存对应的当前GLV文件编号；
+                  phases累计grid、order及write各阶段的耗时，tools按刀具编号(curTool)累计区块数及回形路径层数，
+                  segment保存本区块组的统计结果，参见PreviousOrders
+    @param options: OptimizeOptions设置，为None时使用默认设置
+    @param deadline: 计算移动路径的截止时刻，为None时不限制
+    @param segment: 已经计算完成的segmentOrder结果，为None时在当前进程中计算
+    @return: 按输出顺序排列的区块索引列表
+    @rtype: list
+    """
+    if options is None:
+        options = OptimizeOptions()
+    positions = [blockPosition(block) for block in blocks]
+    if segment is None:
+        segment = segmentOrder(positions, isTopSide, options, deadline, stats is not None)
+    spiral, depths, order, lengths, gridTime, orderTime = segment
+    if stats is not None:
+        # 在子进程中计算的耗时也计入各阶段
+        phases = stats['phases']
+        phases['grid'] += gridTime
+        start = time.time() - orderTime
+        switches, stats['originalGlvIndex'] = countGlvSwitches(glvIndexes, stats['originalGlvIndex'])
+        stats['originalGlvSwitches'] += switches
+        stats['originalTravel'] += lengths[0]
+        spiralGlvIndex = glvIndexes[spiral[0]]
+        spiralSwitches = countGlvSwitches([glvIndexes[i] for i in spiral], spiralGlvIndex)[0]
+        if spiralGlvIndex != stats['spiralGlvIndex']:
+            stats['spiralGlvSwitches'] += 1
+        stats['spiralGlvSwitches'] += spiralSwitches
+        stats['spiralGlvIndex'] = glvIndexes[spiral[-1]]
+        stats['spiralTravel'] += lengths[1]
+    if options.glvWindow:
+        order = groupGlvOrder(order, depths, glvIndexes, curGlvIndex, options.glvWindow)
+    if stats is not None:
+        rings = max(depths) + 1 if depths else 0
+        stats['blocks'] += len(blocks)
+        stats['rings'] += rings
+        if options.glvWindow:
+            travel = pathLength(positions, order)
+        else:
+            travel = lengths[1] if lengths[2] is None else lengths[2]
+        stats['travel'] += travel
+        stats['segment'] = (lengths[0], lengths[1], travel, rings, spiralGlvIndex, stats['spiralGlvIndex'],
+                            spiralSwitches)
+        stats['moved'] += sum(1 for i, j in enumerate(order) if i != j)
+        tool = stats['tools'].setdefault(stats['curTool'], {'blocks': 0, 'rings': 0})
+        tool['blocks'] += len(blocks)
+        tool['rings'] += rings
+        # 统计本身的耗时也计入order阶段
+        phases['order'] += time.time() - start
+    return order
+
+
+class OrderLog(object):
+    """
+    按顺序记录每次outputBlock输出的区块顺序及区块组索引，或者按记录的顺序重新输出区块，
+    用于缓存优化结果，以及保存供增量优化使用的.segments索引文件(参见PreviousOrders)
+    """
+
+    def __init__(self, orders=None, segments=None):
+        """
+        初始化OrderLog对象.
+        @param orders: 之前记录的区块顺序array，为None时记录新的区块顺序
+        @param segments: 之前记录的区块组索引列表，重新输出区块时为None表示没有记录区块组索引
+        @return:None
+        """
+        self.replay = orders is not None
+        self.orders = orders if orders is not None else array('i')
+        self.segments = segments if orders is not None else []
+        self.__position = 0
+
+    def append(self, order, key=None, glvIndex=None, figures=None):
+        """
+        记录一组区块的输出顺序
+        @param order: 区块索引列表
+        @param key: 区块组的散列值(PreviousOrders.segmentKey)，为None时不记录区块组索引
+        @param glvIndex: 输出区块组前的GLV文件编号
+        @param figures: 区块组的统计结果，参见PreviousOrders
+        @return: None
+        """
+        self.orders.extend(order)
+        if key is not None:
+            self.segments.append([key, glvIndex, len(order)] + list(figures))
+
+    def take(self, count):
+        """
+        取出下一组区块的输出顺序
+        @param count: 区块数量
+        @return: 区块索引列表
+        @rtype: list
+        @raise ValueError: 记录的顺序与钻带中的区块不一致
+        """
+        order = self.orders[self.__position:self.__position+count].tolist()
+        if len(order) != count or len(set(order)) != count or (order and (min(order) < 0 or max(order) >= count)):
+            raise ValueError('Cached block order does not match the program')
+        self.__position += count
+        return order
+
+    def finished(self):
+        """返回记录的区块顺序是否已经全部取出"""
+        return self.__position == len(self.orders)
+
+    def save(self, path, params):
+        """
+        将区块组索引及区块顺序保存为.segments索引文件，先写入临时文件再重命名，格式参见PreviousOrders
+        @param path: 索引文件路径
+        @param params: orderParams返回的影响区块顺序的设置
+        @return: None
+        """
+        header = json.dumps({'params': params, 'segments': self.segments}, separators=(',', ':'))
+        with open(path+'.tmp', 'wb') as f:
+            f.write(header.encode('ascii')+b'\n')
+            self.orders.tofile(f)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(path+'.tmp', path)
+
+
+class PreviousOrders(object):
+    """
+    上一次优化的每个区块组的输出顺序，用于钻带只修改了部分区块或增加刀具时的增量优化
+    优化钻带时在钻带旁保存.segments索引文件，第一行为JSON格式的优化设置params及区块组列表segments，每个区块组为
+    [散列值, 输出前的GLV文件编号, 区块数, originalTravel, spiralTravel, travel, rings, 按原有回形路径输出时第一个及
+    最后一个区块的GLV文件编号, 区块组内的切换次数]，其后为按区块组顺序连接的区块输出顺序array
+    区块指令及所在GLV文件都相同的区块组直接使用之前的顺序及统计结果，只有修改过的区块组需要重新建立GridData计算加工顺序；
+    按GLV文件分组输出时还需要输出区块组前的GLV文件编号相同
+    """
+
+    def __init__(self, segments, orders, glvWindow=0):
+        """
+        初始化PreviousOrders对象.
+        @param segments: 区块组索引列表
+        @param orders: 按区块组顺序连接的区块输出顺序array
+        @param glvWindow: 按GLV文件分组的回形路径层数，需要与上一次优化时的设置相同
+        @return:None
+        @raise ValueError: 区块组索引与区块顺序不一致
+        """
+        self.glvWindow = glvWindow
+        self.blocks = len(orders)
+        self.__orders = orders
+        self.__segments = {}        # 区块组的散列值至(区块组前的GLV文件编号, 起始位置, 区块数, 统计结果)列表的映射
+        offset = 0
+        for segment in segments:
+            key, glvIndex, count = segment[:3]
+            entries = self.__segments.setdefault(key, [])
+            if not any(entry[0] == glvIndex for entry in entries):
+                entries.append((glvIndex, offset, count, tuple(segment[3:])))
+            offset += count
+        if offset != len(orders):
+            raise ValueError('Previous segment index does not match the block orders')
+
+    @classmethod
+    def load(cls, path, params, glvWindow=0):
+        """
+        读取上一次优化时保存的.segments索引文件，不需要读取上一次的钻带
+        @param path: 索引文件路径
+        @param params: orderParams返回的本次优化的设置
+        @param glvWindow: 按GLV文件分组的回形路径层数
+        @return: PreviousOrders对象
+        @rtype: PreviousOrders
+        @raise ValueError: 上一次优化的设置与本次不同，或者索引文件不完整
+        """
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline().decode('ascii'))
+            # 比较JSON格式的设置，元组与列表的差别及浮点数的表示方式不影响结果
+            if header['params'] != json.loads(json.dumps(params)):
+                raise ValueError('Previous program was optimized with different options')
+            orders = array('i')
+            orders.fromfile(f, sum(segment[2] for segment in header['segments']))
+        return cls(header['segments'], orders, glvWindow)
+
+    @staticmethod
+    def segmentKey(texts, glvIndexes):
+        """返回区块组中区块指令及所在GLV文件编号的散列值"""
+        text = '\n'.join(texts)
+        digest = hashlib.sha1(text if isinstance(text, bytes) else text.encode('latin-1'))
+        digest.update(str(glvIndexes).encode('ascii'))
+        return digest.hexdigest()
+
+    def contains(self, key):
+        """返回是否有散列值相同的区块组，不检查区块组前的GLV文件编号"""
+        return key in self.__segments
+
+    def find(self, key, curGlvIndex):
+        """
+        查找相同区块组之前的输出顺序
+        @param key: 区块组的散列值
+        @param curGlvIndex: 输出区块组前的GLV文件编号
+        @return: 返回(order, figures)，order为区块索引列表，figures为区块组的统计结果；没有可以使用的顺序时返回None
+        @rtype: tuple or None
+        """
+        for glvIndex, offset, count, figures in self.__segments.get(key, ()):
+            if not self.glvWindow or glvIndex == curGlvIndex:
+                return self.__orders[offset:offset+count].tolist(), figures
+        return None
+
+
+def reusedOrderStats(blocks, order, glvIndexes, stats, figures):
+    """
+    累计使用之前顺序输出的区块组的统计结果，平台移动距离、回形路径层数及按原有回形路径输出的GLV切换次数
+    使用索引文件中保存的结果，不计算回形路径及平台移动距离，累计的结果与完整优化时相同
+    @param blocks: 区块指令的PrgLine记录列表
+    @param order: 之前的输出顺序
+    @param glvIndexes: 每个区块所在的GLV文件编号
+    @param stats: rewritePrg的统计结果，参见blockOutputOrder
+    @param figures: 之前保存的区块组统计结果，参见PreviousOrders
+    @return: None
+    """
+    start = time.time()
+    originalTravel, spiralTravel, travel, rings, spiralFirst, spiralLast, spiralSwitches = figures
+    switches, stats['originalGlvIndex'] = countGlvSwitches(glvIndexes, stats['originalGlvIndex'])
+    stats['originalGlvSwitches'] += switches
+    stats['originalTravel'] += originalTravel
+    if spiralFirst != stats['spiralGlvIndex']:
+        spiralSwitches += 1
+    stats['spiralGlvSwitches'] += spiralSwitches
+    stats['spiralGlvIndex'] = spiralLast
+    stats['spiralTravel'] += spiralTravel
+    stats['travel'] += travel
+    stats['blocks'] += len(blocks)
+    stats['rings'] += rings
+    stats['reusedBlocks'] += len(blocks)
+    stats['moved'] += sum(1 for i, j in enumerate(order) if i != j)
+    stats['segment'] = figures
+    tool = stats['tools'].setdefault(stats['curTool'], {'blocks': 0, 'rings': 0})
+    tool['blocks'] += len(blocks)
+    tool['rings'] += rings
+    stats['phases']['order'] += time.time() - start
+
+
+def outputBlock(f, blocks, curGlvIndex, glvFiles, isTopSide, stats=None, options=None, deadline=None, orders=None,
+                segment=None, previous=None, key=None):
+    """
+    将区块按优化后路径保存到文件中
+    @param blocks: 当前刀具中区块指令的PrgLine记录列表
+    @param glvFiles: GLV文件起始区块编号的GlvFileIndex索引，或者已经查询的每个区块所在的GLV文件编号列表
+    @param stats: 不为None时累计统计结果，详见blockOutputOrder；重放缓存的顺序时只统计blocks、moved及glvSwitches
+    @param options: OptimizeOptions设置，为None时使用默认设置
+    @param deadline: 计算移动路径的截止时刻，为None时不限制
+    @param orders: OrderLog对象，不为None时记录计算的区块顺序及区块组索引，或者直接使用其中记录的区块顺序
+    @param segment: 已经计算完成的segmentOrder结果，为None时在当前进程中计算
+    @param previous: PreviousOrders对象，不为None时相同的区块组直接使用之前的顺序，统计结果参见reusedOrderStats
+    @param key: 已经计算的区块组散列值(PreviousOrders.segmentKey)，为None时需要时再计算
+    @return: 最后一个区块所在的GLV文件编号
+    """
+    if isinstance(glvFiles, GlvFileIndex):
+        glvIndexes = [glvFiles.lookup(block.value) for block in blocks]
+    else:
+        glvIndexes = glvFiles
+    if orders is not None and orders.replay:
+        order = orders.take(len(blocks))
+        if stats is not None:
+            stats['blocks'] += len(blocks)
+            stats['moved'] += sum(1 for i, j in enumerate(order) if i != j)
+    else:
+        if key is None and (previous is not None or (orders is not None and stats is not None)):
+            key = PreviousOrders.segmentKey([block.text for block in blocks], glvIndexes)
+        found = previous.find(key, curGlvIndex) if previous is not None else None
+        if found is None:
+            order = blockOutputOrder(blocks, curGlvIndex, glvIndexes, isTopSide, stats, options, deadline, segment)
+        else:
+            order = found[0]
+            if stats is not None:
+                reusedOrderStats(blocks, order, glvIndexes, stats, found[1])
+        if orders is not None:
+            # 区块组的统计结果只在统计时才有，没有统计结果时不记录区块组索引
+            if stats is not None:
+                orders.append(order, key, curGlvIndex, stats['segment'])
+            else:
+                orders.append(order)
+    start = time.time()
+    # 所有区块指令合并后一次写入文件
+    output = []
+    append = output.append
+    for i in order:
+        glvFileIndex = glvIndexes[i]
+        if curGlvIndex != glvFileIndex:
+            curGlvIndex = glvFileIndex
+            append('M9'+str(curGlvIndex).zfill(2)+'\n')
+            if stats is not None:
+                stats['glvSwitches'] += 1
+        append(blocks[i].text)
+        append('\nM300\n')
+    f.write(''.join(output))
+    if stats is not None:
+        stats['phases']['write'] += time.time() - start
+    return curGlvIndex
+
+
+def encode(s, encoding='gbk'):
+    """对于Python2.x需在Windows环境下将文本编码转换为GBK"""
+    if sys.version_info[0] == 2:
+        return s.encode('gbk')
+    else:
+        return s
+
+
+def checkPrgMessage(isTopSide, prg, options=None):
+    """
+    检查镭射钻带是否满足要求
+    @param isTopSide: 是否为正面钻带
+    @param prg: 钻带内容的行列表，可以只包含程式头及钻带末尾
+    @param options: OptimizeOptions设置，其中指定了扫描区域大小或镭射机设置中有默认扫描区域时，程式头中可以没有Area设置
+    @return: 钻带不满足要求时返回错误信息，满足要求时返回None
+    @rtype: str or None
+    """
+    # 判断是否为三菱机加工钻带
+    if not prg or prg[0] != '%':
+        return '加工钻带无法识别，请确认是否为三菱机加工钻带。'
+
+    # 只遍历一次钻带内容，记录需要检查的设置
+    markers = set()
+    area = None
+    for line in prg:
+        if line in prgMarkers:
+            markers.add(line)
+        elif area is None and line.startswith('(Area:'):
+            area = scanArea([line])
+
+    # 判断是否使用回形加工转换
+    if '(BEST DIVISION:SP1_DIV)' not in markers:
+        return '请使用SP1_DIV回形加工方法转换钻带!'
+
+    # 判断是否有扫描区域大小设置，回形路径按扫描区域大小划分Cell
+    if area is None and (options is None or (options.area is None and options.defaultArea is None)):
+        return '无法识别扫描区域大小，请确认程式头中有(Area:X=...,Y=...)设置，或使用--area指定!'
+
+    # 判断正面是否关闭X-Mirror进行转换
+    if isTopSide and '(X MIRROR:ON)' in markers:
+        return '正面钻带需关闭X Mirror设置进行转换!'
+
+    # 判断反面是否有使用X-Mirror转换
+    if (not isTopSide) and '(X MIRROR:OFF)' in markers:
+        return '反面钻带需使用X Mirror设置进行转换!'
+
+    # 判断镭射钻带是否已经优化过加工路径
+    if '(Drilling Path Optimized)' in markers:
+        return '加工钻带已经优化过加工路径!'
+
+    return None
+
+
+def checkPrg(isTopSide, prg):
+    """检查镭射钻带是否满足要求"""
+    message = checkPrgMessage(isTopSide, prg)
+    if message:
+        print(encode(message))
+        return False
+    return True
+
+
+def prgSide(name):
+    """
+    从钻带文件名中判断钻带的面次，文件名中包含lsrXXYY，XX小于YY时为正面钻带
+    @param name: 钻带文件名
+    @return: 正面钻带返回True，反面钻带返回False，无法识别时返回None
+    @rtype: bool or None
+    """
+    result = regSide.search(name)
+    if not result:
+        return None
+    layers = result.groups()
+    return layers[0] < layers[1]
+
+
+def parseThickness(s):
+    """
+    识别输入的生产板板厚
+    @param s: 输入的板厚，如 2mil、2.0、2.3，为空时默认为2mil
+    @return: 板厚正确时返回'2'或'2.3'，否则返回None
+    @rtype: str or None
+    """
+    s = s.lower().replace('mil', '').replace('2.0', '2').strip()
+    if not s:
+        s = '2'
+    if s == '2' or s == '2.3':
+        return s
+    return None
+
+
+def thicknessCond(isTopSide, thickness):
+    """返回添加至程式头的板厚参数"""
+    if isTopSide:
+        return r"M100(1st-ldd8um-{0}mil-core-2'4mil)".format(thickness)
+    else:
+        return r"M100(2nd-ldd8um-{0}mil-core-2'4mil)".format(thickness)
+
+
+def readHeader(filePath, headerLines=1000):
+    """
+    读取钻带的程式头，程式头为第一个刀具、区块或Glv切换指令之前的所有行
+    @param filePath: 钻带文件路径
+    @param headerLines: 程式头最多读取的行数
+    @return: 删除头尾空字符的行列表
+    @rtype: list
+    """
+    prg = []
+    with open(filePath) as f:
+        for line in f:
+            line = line.strip()
+            if regTool.match(line) or regBlock.match(line) or regGlvIndex.match(line) or len(prg) >= headerLines:
+                break
+            prg.append(line)
+    return prg
+
+
+def sniffPrg(filePath, headerLines=1000, tailSize=4096, chunkSize=1048576):
+    """
+    快速扫描钻带文件，不需要将整个钻带读入内存即可完成钻带的检查
+    程式头为第一个刀具、区块或Glv切换指令之前的所有行，路径优化的备注只会出现在钻带末尾
+    @param filePath: 钻带文件路径
+    @param headerLines: 程式头最多读取的行数
+    @param tailSize: 读取钻带末尾的字节数
+    @param chunkSize: 扫描M900指令时每次读取的字节数
+    @return: 返回(prg, hasM900)，prg为程式头及钻带末尾的行列表，可用于checkPrg检查，hasM900表示钻带中是否有M900指令
+    @rtype: tuple(list, bool)
+    """
+    prg = readHeader(filePath, headerLines)
+    with open(filePath, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell()-tailSize))
+        prg.extend(line.strip() for line in f.read().decode('ascii', 'ignore').splitlines())
+
+    with open(filePath, 'rb') as f:
+        hasM900 = scanM900(f, chunkSize)
+    return prg, hasM900
+
+
+def scanM900(f, chunkSize=1048576):
+    """
+    从文件对象的当前位置开始按块读取钻带，检查钻带中是否有M900指令，找到M900指令后即停止读取
+    @param f: 已打开的钻带文件，可以为二进制或文本模式
+    @param chunkSize: 每次读取的字节数
+    @return: 钻带中是否有M900指令
+    @rtype: bool
+    """
+    return scanPrg(f, chunkSize, False)[0]
+
+
+def scanPrg(f, chunkSize=1048576, checkOptimized=True):
+    """
+    从文件对象的当前位置开始按块读取钻带，检查钻带中是否有M900指令及已经优化过加工路径的备注，
+    每块只检查完整的行，末尾不完整的行留到下一块中检查
+    @param f: 已打开的钻带文件，可以为二进制或文本模式
+    @param chunkSize: 每次读取的字节数
+    @param checkOptimized: 是否检查已经优化过加工路径的备注，为False时找到M900指令后即停止读取
+    @return: 返回(hasM900, optimized)，checkOptimized为False时optimized总是False
+    @rtype: tuple(bool, bool)
+    """
+    reM900 = None
+    rest = None
+    hasM900 = optimized = False
+    while True:
+        chunk = f.read(chunkSize)
+        if reM900 is None:
+            # 根据读取的内容类型选择匹配的正则表达式
+            if isinstance(chunk, bytes):
+                reM900, reOptimized, newline, rest = regM900Bytes, regOptimizedBytes, b'\n', b''
+            else:
+                reM900, reOptimized, newline, rest = regM900, regOptimized, '\n', ''
+        last = not chunk
+        chunk = rest + chunk
+        end = len(chunk) if last else chunk.rfind(newline) + 1
+        if not hasM900 and reM900.search(chunk, 0, end):
+            hasM900 = True
+        if checkOptimized and not optimized and reOptimized.search(chunk, 0, end):
+            optimized = True
+        if last or (hasM900 and (optimized or not checkOptimized)):
+            return hasM900, optimized
+        rest = chunk[end:]
+
+
+def iterPrgLines(f, cond, header=True):
+    """
+    逐行读取钻带内容的生成器，删除每行头尾的空字符和换行符
+    在钻带第一行后插入程式头参数cond，并在钻带最后一行前插入执行路径优化的备注
+    @param f: 已打开的钻带文件
+    @param cond: 添加至程式头的参数
+    @param header: 是否插入程式头参数，从检查点继续处理钻带时已经输出程式头
+    @return: 该函数为生成器函数，每次yield钻带中的一行
+    """
+    def lines():
+        first = header
+        for line in f:
+            yield line.strip()
+            if first:
+                first = False
+                yield cond
+
+    # 预读一行，到达钻带末尾时在最后一行前插入备注
+    previous = None
+    for line in lines():
+        if previous is not None:
+            yield previous
+        previous = line
+    if previous is not None:
+        yield '(Drilling Path Optimized)'
+        yield previous
+
+
+class PrgReader(object):
+    """
+    使用内存映射读取钻带的行迭代器，每次按字节位置扫描一大块完整的行后再分割为行，减少在网络共享目录中读取文件的次数
+    python3中按latin-1解码，再按latin-1编码写入时可以还原任意编码的原始字节
+    """
+
+    def __init__(self, filePath, chunkSize=4194304, offset=0):
+        """
+        初始化PrgReader对象.
+        @param filePath: 钻带文件路径
+        @param chunkSize: 每次扫描的字节数
+        @param offset: 开始读取的字节位置，必须为一行的开始位置
+        @return:None
+        """
+        self.filePath = filePath
+        self.chunkSize = chunkSize
+        self.offset = offset
+        self.__file = None
+        self.__map = None
+        self.__chunkStart = offset  # 当前块的字节位置
+        self.__chunkSize = 0        # 当前块的字节数
+        self.__chunkLine = 0        # 当前块之前已经读取的行数
+        self.__chunkLines = []      # 当前块中的行
+
+    def __enter__(self):
+        self.__file = open(self.filePath, 'rb')
+        try:
+            self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, EnvironmentError):
+            # 空文件或不支持内存映射的文件系统按块读取文件
+            self.__map = None
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        # 需要在重命名钻带文件之前关闭，否则Windows中无法重命名
+        if self.__map is not None:
+            self.__map.close()
+        self.__file.close()
+
+    def chunks(self):
+        """按块返回钻带内容的生成器，每块都以完整的行结束(钻带末尾除外)"""
+        if self.__map is None:
+            self.__file.seek(self.offset)
+            rest = b''
+            for chunk in iter(lambda: self.__file.read(self.chunkSize), b''):
+                chunk = rest + chunk
+                end = chunk.rfind(b'\n') + 1
+                if end:
+                    yield chunk[:end]
+                rest = chunk[end:]
+            if rest:
+                yield rest
+            return
+        data = self.__map
+        size = len(data)
+        start = self.offset
+        while start < size:
+            end = data.find(b'\n', min(start+self.chunkSize, size)-1) + 1 or size
+            yield data[start:end]
+            start = end
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            if sys.version_info[0] > 2:
+                chunk = chunk.decode('latin-1')
+            lines = chunk.split('\n')
+            # 以换行符结束的块分割后最后一项为空字符串
+            if not lines[-1]:
+                lines.pop()
+            self.__chunkStart += self.__chunkSize
+            self.__chunkSize = len(chunk)
+            self.__chunkLine += len(self.__chunkLines)
+            self.__chunkLines = lines
+            for line in lines:
+                yield line
+
+    def lineOffset(self, count):
+        """
+        返回从offset开始读取count行之后的字节位置，count行必须在当前块或上一块的末尾
+        @param count: 从offset开始已经处理的行数
+        @return: 下一行的字节位置
+        @rtype: int
+        """
+        n = count - self.__chunkLine
+        if not 0 <= n <= len(self.__chunkLines):
+            raise ValueError('Line {0} is not in the current chunk'.format(count))
+        return self.__chunkStart + sum(len(line)+1 for line in self.__chunkLines[:n])
+
+
+class PrgWriter(object):
+    """缓存写入内容的钻带文件写入对象，缓存超过bufferSize时按latin-1编码一次写入文件，换行符转换为系统换行符"""
+
+    def __init__(self, f, bufferSize=4194304):
+        """
+        初始化PrgWriter对象.
+        @param f: 以二进制方式打开的文件
+        @param bufferSize: 缓存的字符数
+        @return:None
+        """
+        self.file = f
+        self.bufferSize = bufferSize
+        self.__buffer = []
+        self.__size = 0
+
+    def write(self, text):
+        self.__buffer.append(text)
+        self.__size += len(text)
+        if self.__size >= self.bufferSize:
+            self.flush()
+
+    def flush(self):
+        """将缓存内容写入文件"""
+        data = ''.join(self.__buffer)
+        self.__buffer = []
+        self.__size = 0
+        if os.linesep != '\n':
+            data = data.replace('\n', os.linesep)
+        if sys.version_info[0] > 2:
+            data = data.encode('latin-1')
+        self.file.write(data)
+        self.file.flush()
+
+    def sync(self):
+        """写入缓存内容并等待数据保存至磁盘"""
+        self.flush()
+        os.fsync(self.file.fileno())
+
+
+def replaceFile(src, dst):
+    """用src文件替换dst文件，python3中为原子操作"""
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    else:
+        if os.name == 'nt' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+def commitFile(filePath, tmpPath, bakPath):
+    """
+    将原始钻带文件备份为bakPath，并用已经保存至磁盘的临时文件替换原始钻带
+    支持硬链接时先建立备份的硬链接再替换钻带，过程中钻带文件始终存在
+    @return: None
+    """
+    if os.path.exists(bakPath):
+        os.remove(bakPath)
+    try:
+        os.link(filePath, bakPath)
+    except (AttributeError, EnvironmentError):
+        os.rename(filePath, bakPath)
+    replaceFile(tmpPath, filePath)
+    if hasattr(os, 'O_DIRECTORY'):
+        # 保存目录项的修改，确保替换后的文件名在断电后仍然有效
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(filePath)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except EnvironmentError:
+            pass
+
+
+class Checkpoint(object):
+    """
+    钻带处理进度的检查点，每隔interval秒在刀具切换处(outputBlock输出全部区块之后)保存一次
+    检查点记录输入钻带的字节位置、临时文件已写入的字节数及rewritePrg的处理状态，中断后重新处理时从检查点继续
+    """
+
+    def __init__(self, path, fingerprint, interval=60):
+        """
+        初始化Checkpoint对象.
+        @param path: 检查点文件路径
+        @param fingerprint: 钻带文件及处理参数的标识，与检查点文件中保存的标识不同时不使用该检查点
+        @param interval: 保存检查点的最小间隔时间(秒)
+        @return:None
+        """
+        self.path = path
+        self.fingerprint = fingerprint
+        self.interval = interval
+        self.state = None           # 从检查点恢复的rewritePrg处理状态，为None时从头开始处理
+        self.inputOffset = 0        # 输入钻带中继续处理的字节位置
+        self.outputBytes = 0        # 临时文件中已经完成的字节数
+        self.reader = None
+        self.writer = None
+        self.__last = time.time()
+
+    def load(self, tmpPath):
+        """
+        读取检查点文件，检查点与当前钻带及参数一致且临时文件完整时设置state
+        @param tmpPath: 临时文件路径
+        @return: 是否可以从检查点继续处理
+        @rtype: bool
+        """
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data['fingerprint'] == self.fingerprint and os.path.getsize(tmpPath) >= data['outputBytes']:
+                self.state = data['state']
+                self.inputOffset = data['inputOffset']
+                self.outputBytes = data['outputBytes']
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            self.state = None
+        return self.state is not None
+
+    def attach(self, reader, writer):
+        """设置读取钻带的PrgReader及写入临时文件的PrgWriter"""
+        self.reader = reader
+        self.writer = writer
+        self.__last = time.time()
+
+    def due(self):
+        """返回是否需要保存检查点"""
+        return time.time() - self.__last >= self.interval
+
+    def save(self, lineCount, state):
+        """
+        将临时文件保存至磁盘后保存检查点，先写入临时检查点文件再替换，中断时不会留下不完整的检查点
+        @param lineCount: 本次从inputOffset开始已经处理完成的钻带行数
+        @param state: rewritePrg的处理状态
+        @return: None
+        """
+        self.writer.sync()
+        data = {'fingerprint': self.fingerprint, 'state': state,
+                'inputOffset': self.reader.lineOffset(lineCount), 'outputBytes': self.writer.file.tell()}
+        with open(self.path+'.tmp', 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        replaceFile(self.path+'.tmp', self.path)
+        self.__last = time.time()
+
+    def remove(self):
+        """处理完成后删除检查点文件"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class SegmentWriter(object):
+    """
+    按原始顺序输出钻带内容及区块组(每次刀具切换或其他指令之前缓存的区块)
+    设置了进程池时，每个区块组的顺序提交至子进程中并行计算，其后的钻带内容先缓存，
+    前面的区块组计算完成后再依次输出，输出时按顺序重新计算GLV文件切换指令，结果与不使用进程池时完全相同
+    """
+
+    def __init__(self, f, curGlvIndex, glvFiles, isTopSide, stats, options, deadline=None, orders=None,
+                 executor=None, minBlocks=1000, previous=None):
+        """
+        初始化SegmentWriter对象.
+        @param f: 输出钻带的文件对象
+        @param curGlvIndex: 当前的GLV文件编号
+        @param glvFiles: GLV文件起始区块编号的GlvFileIndex索引
+        @param stats: rewritePrg的统计结果
+        @param orders: OrderLog对象，参见outputBlock
+        @param executor: 计算区块组顺序的进程池，为None时在当前进程中依次计算
+        @param minBlocks: 区块数少于minBlocks的区块组不提交至进程池
+        @param previous: PreviousOrders对象，有相同区块组的区块组不提交至进程池，参见outputBlock
+        @return:None
+        """
+        self.file = f
+        self.curGlvIndex = curGlvIndex
+        self.glvFiles = glvFiles
+        self.isTopSide = isTopSide
+        self.stats = stats
+        self.options = options
+        self.deadline = deadline
+        self.orders = orders
+        self.executor = executor
+        self.minBlocks = minBlocks
+        self.previous = previous
+        self.maxPending = 2 * options.segmentWorkers
+        self.__queue = collections.deque()     # 等待输出的钻带内容(str)及区块组(tuple)
+        self.__pending = 0                      # 队列中区块组的个数
+
+    def write(self, text):
+        """输出钻带内容，前面还有区块组没有输出时先缓存"""
+        if self.__queue:
+            self.__queue.append(text)
+        else:
+            self.file.write(text)
+
+    def outputBlock(self, blocks, tool):
+        """
+        输出一组区块，区块所在的GLV文件编号在调用时确定
+        @param blocks: 区块指令的PrgLine记录列表
+        @param tool: 区块所在的刀具编号
+        @return: None
+        """
+        glvIndexes = [self.glvFiles.lookup(block.value) for block in blocks]
+        if self.executor is None:
+            self.curGlvIndex = outputBlock(self.file, blocks, self.curGlvIndex, glvIndexes, self.isTopSide,
+                                           self.stats, self.options, self.deadline, self.orders,
+                                           previous=self.previous)
+            return
+        future = key = None
+        if self.previous is not None:
+            key = PreviousOrders.segmentKey([block.text for block in blocks], glvIndexes)
+        if len(blocks) >= self.minBlocks and not (key is not None and self.previous.contains(key)):
+            positions = [blockPosition(block) for block in blocks]
+            future = self.executor.submit(segmentOrder, positions, self.isTopSide, self.options, self.deadline,
+                                          self.stats is not None)
+        self.__queue.append((blocks, glvIndexes, tool, future, key))
+        self.__pending += 1
+        if self.__pending > self.maxPending:
+            self.drain(self.maxPending)
+
+    def drain(self, limit=0):
+        """
+        按顺序输出队列中的内容，直至队列中的区块组不超过limit个
+        @param limit: 队列中保留的区块组个数
+        @return: None
+        """
+        queue = self.__queue
+        while queue:
+            item = queue[0]
+            if isinstance(item, tuple):
+                if self.__pending <= limit:
+                    break
+                blocks, glvIndexes, tool, future, key = item
+                # 区块按所在的刀具统计，而不是当前解析到的刀具
+                curTool = self.stats['curTool']
+                self.stats['curTool'] = tool
+                self.curGlvIndex = outputBlock(self.file, blocks, self.curGlvIndex, glvIndexes, self.isTopSide,
+                                               self.stats, self.options, self.deadline, self.orders,
+                                               future.result() if future is not None else None, self.previous, key)
+                self.stats['curTool'] = curTool
+                self.__pending -= 1
+            else:
+                self.file.write(item)
+            queue.popleft()
+
+
+def rewritePrg(lines, f, isTopSide, hasM900, options=None, orders=None, checkpoint=None, executor=None,
+               previous=None):
+    """
+    按照优化后的区块路径重写镭射机加工程序，每次只缓存当前刀具中的区块，输出的内容依次写入文件
+    @param lines: 钻带内容的行迭代器
+    @param f: 输出钻带的文件对象
+    @param isTopSide: 是否为正面钻带
+    @param hasM900: 钻带中是否有M900指令
+    @param options: OptimizeOptions设置，为None时使用默认设置
+    @param orders: OrderLog对象，不为None时记录每组区块的输出顺序，或者按其中记录的顺序输出区块
+    @param checkpoint: Checkpoint对象，不为None时定期在刀具切换处保存检查点，其中有state时从检查点继续处理，
+                       此时lines为从检查点位置开始的钻带内容，并且不再插入程式头参数
+    @param executor: 计算区块组顺序的进程池，为None时根据options.segmentWorkers创建，传入的进程池不会被关闭
+    @param previous: PreviousOrders对象，不为None时未修改的区块组直接使用上一次优化的顺序
+    @return: 处理结果的统计，blocks为区块总数，moved为加工顺序发生变化的区块数，rings为回形路径层数之和，
+             glvSwitches为输出的M90x切换次数，originalGlvSwitches及spiralGlvSwitches为按原始顺序及按原有回形路径
+             输出时的切换次数，travel、originalTravel及spiralTravel为对应的每个刀具中的平台移动距离之和(mm)，
+             cycleSeconds、originalCycleSeconds及spiralCycleSeconds为对应的估算加工时间(秒)，
+             tools为每个刀具(T03-T23合并为T02)的区块数及回形路径层数，phases为parse、grid、order及write各阶段的耗时，
+             reusedBlocks为使用上一次优化顺序的区块数，这些区块组的统计结果为上一次保存的结果
+    @rtype: dict
+    """
+    if options is None:
+        options = OptimizeOptions()
+    start = time.time()
+    curTool = 0                 # 当前区块的刀具编号
+    curBlock = 0                # 当前的区块编号
+    curGlvIndex = 0             # 当前区块所在的GLV文件编号
+    if hasM900:
+        curGlvIndex = -1        # 当钻带中有GLV文件切换指令时才增加切换指令，单个GLV文件不添加M90x指令
+    glvFiles = GlvFileIndex()   # 保存每个GLV文件中起始区块编号的索引，处理过程中根据M90x指令自动识别更新
+    blocks = []                 # 当前刀具中等待优化路径的区块，输出时按照扫描区域大小的间隔划分每个回形加工路径间隔
+    flagIndex = -1
+    stats = {'blocks': 0, 'moved': 0, 'rings': 0, 'glvSwitches': 0, 'travel': 0.0,
+             'originalGlvSwitches': 0, 'originalGlvIndex': curGlvIndex, 'originalTravel': 0.0,
+             'spiralGlvSwitches': 0, 'spiralGlvIndex': curGlvIndex, 'spiralTravel': 0.0, 'reusedBlocks': 0,
+             'tools': {}, 'curTool': curTool, 'phases': {'grid': 0.0, 'order': 0.0, 'write': 0.0}}
+    deadline = options.deadline()
+    # 插入程式头参数时，处理完第n行(n>1)时实际读取的钻带行数为n-1
+    headerLines = 1
+    if checkpoint is not None and checkpoint.state is not None:
+        state = checkpoint.state
+        curTool = state['curTool']
+        curBlock = state['curBlock']
+        curGlvIndex = state['curGlvIndex']
+        flagIndex = state['flagIndex']
+        glvFiles = GlvFileIndex.fromStarts(state['glvStarts'])
+        stats = state['stats']
+        # JSON中字典的键值均为字符串
+        stats['tools'] = dict((int(tool), value) for tool, value in stats['tools'].items())
+        start = time.time() - state['elapsed']
+        headerLines = 0
+
+    ownExecutor = None
+    if orders is not None and orders.replay:
+        executor = None
+    elif executor is None and options.segmentWorkers > 1:
+        executor = ownExecutor = processPool(options.segmentWorkers)
+    out = SegmentWriter(f, curGlvIndex, glvFiles, isTopSide, stats, options, deadline, orders, executor,
+                        previous=previous)
+    try:
+        for lineCount, record in enumerate(tokenizePrg(lines, options.numberLength, options.leadZero), 1):
+            kind = record.kind
+            if kind == PrgLine.TOOL:
+                # 识别刀具切换指令
+                toolNum = record.value
+                # 将T03-T23合并为T02
+                if 2 < toolNum < 24:
+                    toolNum = 2
+                if toolNum != curTool:
+                    if blocks:
+                        out.outputBlock(blocks, curTool)
+                        blocks = []
+                    curTool = toolNum
+                    stats['curTool'] = curTool
+                    out.write('M1'+str(curTool).zfill(2)+'\n')
+                    if checkpoint is not None and lineCount > headerLines and checkpoint.due():
+                        # 保存检查点前需要输出全部区块组
+                        out.drain()
+                        checkpoint.save(lineCount - headerLines, {
+                            'curTool': curTool, 'curBlock': curBlock, 'curGlvIndex': out.curGlvIndex,
+                            'flagIndex': flagIndex, 'glvStarts': glvFiles.starts, 'stats': stats,
+                            'elapsed': time.time() - start})
+            elif kind == PrgLine.BLOCK:
+                # 识别区块指令
+                curBlock = record.value
+                blocks.append(record)
+                # 如果前一个指令为Glv切换指令，则更新glv区块文件域值列表
+                if flagIndex > -1:
+                    glvFiles.setStart(flagIndex, curBlock)
+                    flagIndex = -1
+            elif kind == PrgLine.M300:
+                # 识别区块加工执行指令，输出优化后区块路径时可以自动添加，故删除原M300指令
+                pass
+            elif kind == PrgLine.GLV:
+                # 识别Glv数据文件切换指令
+                glvIndex = record.value
+                glvFiles.addFile(glvIndex)
+                flagIndex = glvIndex
+            else:
+                if blocks:
+                    out.outputBlock(blocks, curTool)
+                    blocks = []
+                out.write(record.text+'\n')
+        out.drain()
+    finally:
+        if ownExecutor is not None:
+            ownExecutor.shutdown()
+    if orders is not None and orders.replay and not orders.finished():
+        raise ValueError('Cached block order does not match the program')
+    del stats['originalGlvIndex'], stats['spiralGlvIndex'], stats['curTool']
+    stats.pop('segment', None)
+    phases = stats['phases']
+    phases['parse'] = time.time() - start - phases['grid'] - phases['order'] - phases['write']
+    stats['cycleSeconds'] = options.cycleTime(stats['travel'], stats['blocks'], stats['glvSwitches'])
+    stats['originalCycleSeconds'] = options.cycleTime(stats['originalTravel'], stats['blocks'],
+                                                      stats['originalGlvSwitches'])
+    stats['spiralCycleSeconds'] = options.cycleTime(stats['spiralTravel'], stats['blocks'], stats['spiralGlvSwitches'])
+    return stats
+
+
+def writeMetrics(filePath, stats, isTopSide, cond, options):
+    """
+    将路径优化的统计结果保存至钻带旁的.metrics.json文件中，便于汇总分析大量钻带的优化效果
+    @param filePath: 钻带文件路径
+    @param stats: rewritePrg返回的统计结果
+    @param cond: 程式头添加的参数
+    @param options: OptimizeOptions设置
+    @return: 统计文件路径
+    @rtype: str
+    """
+    metrics = dict(stats)
+    metrics['tools'] = dict(('T'+str(tool).zfill(2), value) for tool, value in stats['tools'].items())
+    metrics['file'] = os.path.basename(filePath)
+    metrics['side'] = 'top' if isTopSide else 'bottom'
+    metrics['cond'] = cond
+    metrics['time'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    metrics['options'] = {'glvWindow': options.glvWindow, 'travel': options.travel, 'travelTime': options.travelTime,
+                          'stageSpeed': options.stageSpeed, 'dwell': options.dwell, 'area': options.area,
+                          'machine': options.machine, 'subGrid': options.subGrid, 'glvSwitchTime': options.glvSwitchTime}
+    metricsPath = os.path.splitext(filePath)[0]+'.metrics.json'
+    with open(metricsPath, 'w') as f:
+        json.dump(metrics, f, indent=2, sort_keys=True, separators=(',', ': '))
+    return metricsPath
+
+
+def orderParams(isTopSide, options):
+    """
+    返回影响区块顺序的设置，用于缓存键值及.segments索引文件
+    python2与python3的round()取整方式不同，区块顺序可能不同，因此也包括Python的主版本号
+    @rtype: tuple
+    """
+    return (CACHE_VERSION, sys.version_info[0], isTopSide, options.gridPitch(), options.numberLength, options.leadZero,
+            options.glvWindow, options.travel, options.subGridPitch())
+
+
+def programKey(filePath, isTopSide, cond, hasM900, options, chunkSize=1048576):
+    """
+    计算钻带优化结果的缓存键值：钻带中第一个刀具、区块或Glv切换指令之后的内容及优化参数的哈希值
+    只修改程式头的钻带与原钻带的键值相同
+    @param filePath: 钻带文件路径
+    @param cond: 程式头添加的参数，包含面次及板厚
+    @param options: OptimizeOptions设置，只有影响区块顺序的设置会计入键值
+    @return: 十六进制的哈希值
+    @rtype: str
+    """
+    digest = hashlib.sha1()
+    digest.update(repr(orderParams(isTopSide, options) + (cond, hasM900)).encode('utf-8'))
+    with open(filePath, 'rb') as f:
+        for line in iter(f.readline, b''):
+            text = line.decode('ascii', 'ignore').strip()
+            if regTool.match(text) or regBlock.match(text) or regGlvIndex.match(text):
+                digest.update(line)
+                break
+        for chunk in iter(lambda: f.read(chunkSize), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    """
+    保存钻带优化结果的磁盘缓存，每个结果包括区块输出顺序(.order)及统计结果(.json)两个文件
+    读取结果时更新文件的修改时间，超过缓存容量时删除修改时间最早(最久未使用)的结果
+    """
+
+    def __init__(self, folder, maxSize=256):
+        """
+        初始化ResultCache对象.
+        @param folder: 缓存目录
+        @param maxSize: 缓存的最大容量(MB)
+        @return:None
+        """
+        self.folder = folder
+        self.maxSize = maxSize * 1024 * 1024
+
+    def __path(self, key, ext):
+        return os.path.join(self.folder, key+ext)
+
+    def get(self, key):
+        """
+        读取缓存的优化结果
+        @param key: programKey返回的键值
+        @return: 返回(orders, stats)，orders为区块顺序的array，stats为统计结果；没有缓存时返回None
+        @rtype: tuple or None
+        """
+        try:
+            with open(self.__path(key, '.json')) as f:
+                stats = json.load(f)
+            orders = array('i')
+            with open(self.__path(key, '.order'), 'rb') as f:
+                orders.fromfile(f, stats['blocks'])
+            for ext in ('.order', '.json'):
+                os.utime(self.__path(key, ext), None)
+        except (IOError, OSError, ValueError, KeyError, EOFError):
+            return None
+        return orders, stats
+
+    def put(self, key, orders, stats):
+        """
+        保存优化结果，先写入临时文件再重命名，多个进程同时写入时不会读取到不完整的文件
+        @param orders: 区块顺序的array
+        @param stats: rewritePrg返回的统计结果
+        @return: None
+        """
+        if not os.path.isdir(self.folder):
+            try:
+                os.makedirs(self.folder)
+            except OSError:
+                if not os.path.isdir(self.folder):
+                    raise
+        suffix = '.{0}.tmp'.format(os.getpid())
+        with open(self.__path(key, '.order'+suffix), 'wb') as f:
+            orders.tofile(f)
+        with open(self.__path(key, '.json'+suffix), 'w') as f:
+            json.dump(stats, f)
+        for ext in ('.order', '.json'):
+            if os.path.exists(self.__path(key, ext)):
+                os.remove(self.__path(key, ext))
+            os.rename(self.__path(key, ext+suffix), self.__path(key, ext))
+        self.evict()
+
+    def remove(self, key):
+        """删除缓存的优化结果"""
+        for ext in ('.order', '.json'):
+            try:
+                os.remove(self.__path(key, ext))
+            except OSError:
+                pass
+
+    def evict(self):
+        """缓存超过最大容量时，按照最后使用时间从早到晚删除缓存结果"""
+        entries = []
+        total = 0
+        for orderPath in glob.glob(os.path.join(self.folder, '*.order')):
+            key = os.path.splitext(os.path.basename(orderPath))[0]
+            try:
+                size = os.path.getsize(orderPath) + os.path.getsize(self.__path(key, '.json'))
+                entries.append((os.path.getmtime(orderPath), size, key))
+            except OSError:
+                continue
+            total += size
+        entries.sort()
+        for mtime, size, key in entries:
+            if total <= self.maxSize:
+                break
+            self.remove(key)
+            total -= size
+
+
+def loadPreviousOrders(filePath, isTopSide, options):
+    """
+    从options.previousDir中读取同名钻带上一次优化时保存的.segments索引文件
+    @return: PreviousOrders对象，没有设置目录、没有索引文件、索引文件不完整或者优化设置不同时返回None
+    @rtype: PreviousOrders or None
+    """
+    if not options.previousDir:
+        return None
+    path = os.path.join(options.previousDir, os.path.splitext(os.path.basename(filePath))[0]+'.segments')
+    try:
+        return PreviousOrders.load(path, orderParams(isTopSide, options), options.glvWindow)
+    except (IOError, OSError, ValueError, KeyError, TypeError, EOFError):
+        return None
+
+
+def rewriteFile(filePath, isTopSide, cond, hasM900, options=None):
+    """
+    重写钻带至临时文件中，完成后将原始钻带文件备份为.bak文件, 用生成的临时钻带替换原始钻带
+    钻带使用PrgReader内存映射读取，使用PrgWriter缓存写入，临时文件保存至磁盘后再替换原始钻带
+    设置了缓存目录时，相同内容及参数的钻带直接使用缓存的区块顺序输出，不需要重新计算加工路径
+    设置了检查点间隔时定期保存处理进度，处理中断后再次处理同一钻带时从最后的检查点继续
+    设置了上一次优化结果的目录时，未修改的区块组直接使用上一次优化的顺序
+    设置了segmentIndex或上一次优化结果的目录时，完成后在钻带旁保存.segments索引文件，供之后的增量优化使用，参见PreviousOrders
+    @param filePath: 钻带文件路径
+    @param options: OptimizeOptions设置，为None时使用默认设置，设置了metrics时同时保存.metrics.json统计文件
+    @return: rewritePrg返回的统计结果，使用缓存时cached为True，除phases外的统计结果为首次优化时的结果
+    @rtype: dict
+    """
+    if options is None:
+        options = OptimizeOptions()
+    if options.area is None:
+        options = options.forProgram(readHeader(filePath))
+    name = os.path.splitext(filePath)[0]
+
+    def rewrite(orders, checkpoint=None, previous=None):
+        # 写入临时文件并保存至磁盘后才替换原始钻带，中途出错时原始钻带保持不变
+        resume = checkpoint is not None and checkpoint.state is not None
+        offset = checkpoint.inputOffset if resume else 0
+        with PrgReader(filePath, offset=offset) as lines, open(name+'.tmp', 'r+b' if resume else 'wb') as f:
+            if resume:
+                # 删除检查点之后写入的内容
+                f.truncate(checkpoint.outputBytes)
+                f.seek(0, os.SEEK_END)
+            writer = PrgWriter(f)
+            if checkpoint is not None:
+                checkpoint.attach(lines, writer)
+            result = rewritePrg(iterPrgLines(lines, cond, not resume), writer, isTopSide, hasM900, options,
+                                orders, checkpoint, previous=previous)
+            writer.sync()
+        return result
+
+    checkpoint = None
+    if options.checkpoint:
+        stat = os.stat(filePath)
+        fingerprint = [CACHE_VERSION, sys.version_info[0], stat.st_size, stat.st_mtime, isTopSide, cond, hasM900,
+                       list(options.gridPitch()), options.numberLength, options.leadZero, options.glvWindow,
+                       options.travel, options.subGrid and list(options.subGridPitch())]
+        checkpoint = Checkpoint(name+'.ckpt', fingerprint, options.checkpoint)
+        checkpoint.load(name+'.tmp')
+
+    cache = cached = key = None
+    if options.cacheDir:
+        cache = ResultCache(options.cacheDir, options.cacheSize)
+        key = programKey(filePath, isTopSide, cond, hasM900, options)
+        cached = cache.get(key)
+    stats = orders = None
+    if cached is not None:
+        orders = OrderLog(cached[0], cached[1].pop('segments', None))
+        try:
+            replayed = rewrite(orders)
+        except ValueError:
+            # 缓存的结果与钻带不一致时删除缓存，重新优化钻带
+            cache.remove(key)
         else:
-            print(encode('无法识别钻带面次: '+name+ext+'\n'))
+            stats = cached[1]
+            stats['phases'] = replayed['phases']
+            stats['cached'] = True
+    saveIndex = options.segmentIndex or bool(options.previousDir)
+    if stats is None:
+        # 从检查点继续处理时没有之前的区块顺序，不保存至缓存及索引文件
+        orders = None
+        if (cache is not None or saveIndex) and (checkpoint is None or checkpoint.state is None):
+            orders = OrderLog()
+        stats = rewrite(orders, checkpoint, loadPreviousOrders(filePath, isTopSide, options))
+        if orders is not None and cache is not None:
+            result = dict((k, v) for k, v in stats.items() if k != 'phases')
+            result['segments'] = orders.segments
+            cache.put(key, orders.orders, result)
+        stats['cached'] = False
+    commitFile(filePath, name+'.tmp', name+'.bak')
+    if saveIndex and orders is not None and orders.segments is not None:
+        orders.save(name+'.segments', orderParams(isTopSide, options))
+    elif os.path.exists(name+'.segments'):
+        # 删除之前优化时保存的索引文件，避免与本次优化的结果不一致
+        os.remove(name+'.segments')
+    if checkpoint is not None:
+        checkpoint.remove()
+    elif os.path.exists(name+'.ckpt'):
+        # 不保存检查点时删除之前中断处理时留下的检查点，其进度对应的临时文件已经被本次结果替换
+        os.remove(name+'.ckpt')
+    if options.metrics:
+        writeMetrics(filePath, stats, isTopSide, cond, options)
+    return stats
+
+
+def optimizeFile(filePath, thickness, options=None):
+    """
+    不需要交互输入，完成单个钻带的检查及路径优化，供批量处理使用
+    @param filePath: 钻带文件路径
+    @param thickness: 生产板板厚
+    @param options: OptimizeOptions设置，为None时使用默认设置
+    @return: rewriteFile返回的统计结果，并增加处理时间seconds及与原有回形路径相比估算节省的加工时间savedSeconds
+    @rtype: dict
+    @raise ValueError: 钻带不满足路径优化要求或板厚不正确
+    """
+    start = time.time()
+    isTopSide = prgSide(os.path.splitext(filePath)[0])
+    if isTopSide is None:
+        raise ValueError('无法识别钻带面次')
+    value = parseThickness(thickness)
+    if value is None:
+        raise ValueError('板厚大小不正确: '+thickness)
+    prg, hasM900 = sniffPrg(filePath)
+    message = checkPrgMessage(isTopSide, prg, options)
+    if message:
+        raise ValueError(message)
+    stats = rewriteFile(filePath, isTopSide, thicknessCond(isTopSide, value), hasM900, options)
+    stats['seconds'] = time.time() - start
+    stats['savedSeconds'] = stats['spiralCycleSeconds'] - stats['cycleSeconds']
+    return stats
+
+
+class HotPathStats(object):
+    """
+    热点函数的调用次数、总耗时及耗时分布，耗时分布按微秒数的二进制位数分组(第i组为小于2**i微秒的调用)
+    只在instrumentHotPaths替换热点函数后才会记录
+    """
+
+    def __init__(self):
+        """
+        初始化HotPathStats对象.
+        @return:None
+        """
+        self.counters = {}
+
+    def counter(self, name):
+        """
+        返回函数的计数器[调用次数, 总耗时, 耗时分布]，计时函数直接更新计数器，避免每次调用时再查找或调用记录函数
+        @param name: 函数名称
+        @rtype: list
+        """
+        if name not in self.counters:
+            self.counters[name] = [0, 0.0, [0]*64]
+        return self.counters[name]
+
+    def reset(self):
+        """清除所有记录，每个钻带开始处理前调用，计时函数中保存的计数器保持不变"""
+        for counter in self.counters.values():
+            counter[0] = 0
+            counter[1] = 0.0
+            counter[2][:] = [0]*64
+
+    @staticmethod
+    def percentile(histogram, count, ratio):
+        """返回耗时分布中ratio比例的调用不超过的耗时上限(微秒)"""
+        total = 0
+        for i, value in enumerate(histogram):
+            total += value
+            if total >= count * ratio:
+                return 2 ** i
+        return 2 ** len(histogram)
+
+    def summary(self):
+        """
+        返回每个热点函数的统计结果，calls为调用次数，seconds为总耗时，p50、p90及p99为对应比例的调用不超过的耗时上限(微秒)，
+        histogram为耗时分布，已删除末尾为0的分组
+        @rtype: dict
+        """
+        result = {}
+        for name, (calls, seconds, histogram) in self.counters.items():
+            if not calls:
+                continue
+            histogram = list(histogram)
+            while histogram and histogram[-1] == 0:
+                histogram.pop()
+            result[name] = {'calls': calls, 'seconds': seconds, 'histogram': histogram,
+                            'p50': self.percentile(histogram, calls, 0.5), 'p90': self.percentile(histogram, calls, 0.9),
+                            'p99': self.percentile(histogram, calls, 0.99)}
+        return result
+
+
+def timedCall(counter, func):
+    """返回记录每次调用耗时的函数，counter为HotPathStats.counter返回的计数器"""
+    histogram = counter[2]
+
+    def timed(*args, **kwargs):
+        start = clock()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            seconds = clock() - start
+            counter[0] += 1
+            counter[1] += seconds
+            histogram[int(seconds*1e6).bit_length()] += 1
+    timed.__name__ = func.__name__
+    timed.__doc__ = func.__doc__
+    return timed
+
+
+def timedGenerator(counter, func):
+    """返回记录生成器函数耗时的生成器函数，每次调用记录生成器内部的耗时之和，不包括使用生成结果的时间"""
+    histogram = counter[2]
+
+    def timed(*args, **kwargs):
+        spent = 0.0
+        items = func(*args, **kwargs)
+        while True:
+            start = clock()
+            try:
+                item = next(items)
+            except StopIteration:
+                break
+            spent += clock() - start
+            yield item
+        spent += clock() - start
+        counter[0] += 1
+        counter[1] += spent
+        histogram[int(spent*1e6).bit_length()] += 1
+    timed.__name__ = func.__name__
+    timed.__doc__ = func.__doc__
+    return timed
+
+
+def timedLines(counter, func):
+    """返回记录每行处理耗时的生成器函数，即钻带逐行处理循环中两次取出下一行之间的时间"""
+    histogram = counter[2]
+
+    def timed(*args, **kwargs):
+        count = 0
+        last = begin = clock()
+        for item in func(*args, **kwargs):
+            yield item
+            now = clock()
+            histogram[int((now - last)*1e6).bit_length()] += 1
+            count += 1
+            last = now
+        counter[0] += count
+        counter[1] += last - begin
+    timed.__name__ = func.__name__
+    timed.__doc__ = func.__doc__
+    return timed
+
+
+def instrumentHotPaths():
+    """
+    将hotPaths中的热点函数替换为记录调用次数及耗时的函数，统计结果保存在hotPathStats中，每个进程只替换一次
+    不调用本函数时热点函数保持原样，不增加任何开销
+    @return: hotPathStats
+    @rtype: HotPathStats
+    """
+    global hotPathStats
+    if hotPathStats is not None:
+        return hotPathStats
+    hotPathStats = HotPathStats()
+    module = sys.modules[__name__]
+    for name, kind in hotPaths:
+        wrap = {'call': timedCall, 'generator': timedGenerator, 'lines': timedLines}[kind]
+        counter = hotPathStats.counter(name+'/line' if kind == 'lines' else name)
+        if '.' in name:
+            className, attr = name.split('.')
+            cls = getattr(module, className)
+            value = cls.__dict__[attr]
+            if isinstance(value, classmethod):
+                setattr(cls, attr, classmethod(wrap(counter, value.__func__)))
+            else:
+                setattr(cls, attr, wrap(counter, value))
+        else:
+            setattr(module, name, wrap(counter, getattr(module, name)))
+    return hotPathStats
+
+
+def topCostCentres(profiler, count=10):
+    """
+    返回cProfile中自身耗时最多的函数
+    @param profiler: 已完成统计的cProfile.Profile对象
+    @param count: 返回的函数个数
+    @return: 按自身耗时排列的(函数名, 文件名:行号, 调用次数, 自身耗时, 累计耗时)列表，不包括热点函数的计时函数
+    @rtype: list
+    """
+    import pstats
+    entries = []
+    for (fileName, line, funcName), (primitive, calls, tottime, cumtime, callers) in pstats.Stats(profiler).stats.items():
+        if fileName == timedCall.__code__.co_filename and funcName == 'timed':
             continue
-        if isTopSide[0] < isTopSide[1]:
-            isTopSide = True
+        entries.append((funcName, '{0}:{1}'.format(os.path.basename(fileName), line), calls, tottime, cumtime))
+    entries.sort(key=lambda entry: entry[3], reverse=True)
+    return entries[:count]
+
+
+def profileFile(filePath, thickness, options=None, profileDir='.', top=10):
+    """
+    使用cProfile及热点函数统计完成单个钻带的路径优化，参数与optimizeFile相同
+    cProfile结果保存为profileDir中与钻带同名的.pstats文件，可以使用pstats、snakeviz或flameprof等工具查看；
+    热点函数的调用次数及耗时分布保存为同名的.hotpaths.json文件
+    @param profileDir: 保存统计文件的目录
+    @param top: 返回的自身耗时最多的函数个数
+    @return: optimizeFile的统计结果，并增加profile：pstats及hotPaths为统计文件路径，top为topCostCentres的结果，
+             hotPaths为HotPathStats.summary的结果
+    @rtype: dict
+    @raise ValueError: 钻带不满足路径优化要求或板厚不正确，或者设置了多个segmentWorkers(子进程中的耗时无法统计)
+    """
+    if options is not None and options.segmentWorkers > 1:
+        raise ValueError('Profiling does not support segment workers')
+    import cProfile
+    instrumentHotPaths().reset()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        stats = optimizeFile(filePath, thickness, options)
+    finally:
+        profiler.disable()
+    name = os.path.join(profileDir, os.path.splitext(os.path.basename(filePath))[0])
+    profiler.dump_stats(name+'.pstats')
+    hotPaths = hotPathStats.summary()
+    with open(name+'.hotpaths.json', 'w') as f:
+        json.dump(hotPaths, f, indent=2, sort_keys=True, separators=(',', ': '))
+    stats['profile'] = {'pstats': name+'.pstats', 'hotPathsFile': name+'.hotpaths.json',
+                        'top': topCostCentres(profiler, top), 'hotPaths': hotPaths}
+    return stats
+
+
+def printProfile(filePath, profile):
+    """输出单个钻带的耗时统计：自身耗时最多的函数及热点函数的调用次数和耗时分布"""
+    print('\n== {0}  ({1})'.format(filePath, profile['pstats']))
+    print('  {0:<32} {1:<28} {2:>10} {3:>10} {4:>10}'.format('Function', 'Location', 'Calls', 'Self(s)', 'Cum(s)'))
+    for funcName, location, calls, tottime, cumtime in profile['top']:
+        print('  {0:<32} {1:<28} {2:>10} {3:>10.3f} {4:>10.3f}'.format(
+            funcName[:32], location[:28], calls, tottime, cumtime))
+    print('  {0:<32} {1:>10} {2:>10} {3:>10} {4:>10} {5:>10}'.format(
+        'Hot path', 'Calls', 'Total(s)', 'p50(us)', 'p90(us)', 'p99(us)'))
+    hotPaths = profile['hotPaths']
+    for name in sorted(hotPaths, key=lambda name: hotPaths[name]['seconds'], reverse=True):
+        counter = hotPaths[name]
+        print('  {0:<32} {1:>10} {2:>10.3f} {3:>10} {4:>10} {5:>10}'.format(
+            name, counter['calls'], counter['seconds'], '<'+str(counter['p50']), '<'+str(counter['p90']),
+            '<'+str(counter['p99'])))
+
+
+def validatePrg(lines, isTopSide, options=None, samples=5):
+    """
+    单次遍历钻带内容，统计区块、刀具及GLV文件，检查钻带结构中的异常，并估算按回形路径加工的层数及平台移动距离，不输出任何内容
+    区块组的划分方式与rewritePrg相同，估算结果与不使用-g、--travel时rewritePrg的统计结果相同
+    @param lines: 钻带内容的行迭代器，每行已删除头尾的空字符
+    @param isTopSide: 是否为正面钻带
+    @param options: OptimizeOptions设置，使用其中的扫描区域大小、坐标格式及估算加工时间的参数
+    @param samples: 每种异常记录的行号个数
+    @return: 检查结果，errors为不能优化的错误信息列表，anomalies为每种异常的次数count及前samples个行号lines：
+             duplicateBlocks为同一区块组(合并T03-T23后的同一刀具中连续的区块)中重复的区块编号，unmappedBlocks为不在任何GLV文件中的区块，
+             boundaryBlocks为恰好位于Cell边界上的区块，malformedBlocks为无法识别的区块指令，
+             missingM300及strayM300为没有M300的区块及不在区块后的M300，emptyGlvSwitches为之后没有区块的M90x指令，
+             emptyTools为没有区块的刀具；blocks、glvFiles、rings、tools及originalGlvSwitches、spiralGlvSwitches、
+             originalTravel、spiralTravel与originalCycleSeconds、spiralCycleSeconds为按原始顺序及回形路径加工的
+             GLV文件切换次数、平台移动距离(mm)及估算加工时间(秒)
+    @rtype: dict
+    """
+    if options is None:
+        options = OptimizeOptions()
+    pitchX, pitchY = options.gridPitch()
+    result = {'errors': [], 'anomalies': {}, 'blocks': 0, 'glvFiles': 0, 'rings': 0, 'tools': {},
+              'originalTravel': 0.0, 'spiralTravel': 0.0, 'originalGlvSwitches': 0, 'spiralGlvSwitches': 0}
+    anomalies = result['anomalies']
+    # 按原始顺序及回形路径输出时的当前GLV文件编号，先按有M900指令统计切换次数，最后再根据是否有M900修正
+    glvState = {'original': -1, 'spiral': -1}
+
+    def report(name, lineNo):
+        anomaly = anomalies.setdefault(name, {'count': 0, 'lines': []})
+        anomaly['count'] += 1
+        if len(anomaly['lines']) < samples:
+            anomaly['lines'].append(lineNo)
+
+    def onBoundary(value, origin, pitch):
+        offset = (value - origin) / pitch
+        return abs(offset - math.floor(offset) - 0.5) < 1e-6
+
+    def flush(blocks, blockLines, tool):
+        # 与rewritePrg相同，在区块组输出时查询每个区块所在的GLV文件
+        glvIndexes = [glvFiles.lookup(block.value) for block in blocks]
+        for glvIndex, lineNo in zip(glvIndexes, blockLines):
+            if glvIndex is None:
+                report('unmappedBlocks', lineNo)
+        positions = [blockPosition(block) for block in blocks]
+        x0, y0 = positions[0]
+        for (x, y), lineNo in zip(positions, blockLines):
+            if onBoundary(x, x0, pitchX) or onBoundary(y, y0, pitchY):
+                report('boundaryBlocks', lineNo)
+        rings = max(ringDepths(positions, pitchX, pitchY)) + 1
+        result['blocks'] += len(blocks)
+        result['rings'] += rings
+        spiral = blockOrder(positions, pitchX, pitchY, isTopSide, subPitch=options.subGridPitch(),
+                            compact=options.compactGrid)
+        result['originalTravel'] += pathLength(positions, range(len(positions)))
+        result['spiralTravel'] += pathLength(positions, spiral)
+        glvState.setdefault('firsts', (glvIndexes[0], glvIndexes[spiral[0]]))
+        switches, glvState['original'] = countGlvSwitches(glvIndexes, glvState['original'])
+        result['originalGlvSwitches'] += switches
+        switches, glvState['spiral'] = countGlvSwitches([glvIndexes[i] for i in spiral], glvState['spiral'])
+        result['spiralGlvSwitches'] += switches
+        stats = result['tools'].setdefault(tool, {'blocks': 0, 'rings': 0})
+        stats['blocks'] += len(blocks)
+        stats['rings'] += rings
+        seen.clear()
+
+    curTool = 0                 # 合并T03-T23后的刀具编号，用于划分区块组
+    toolLine = None             # 当前刀具指令的行号及其中的区块数，用于检查没有区块的刀具
+    toolBlocks = 0
+    seen = set()                # 当前区块组中已经出现的区块编号，区块组的划分与rewritePrg相同
+    glvFiles = GlvFileIndex()
+    glvSeen = set()
+    flagIndex = -1
+    glvLine = None              # 之后还没有区块的M90x指令行号
+    blocks = []
+    blockLines = []
+    previous = None             # 上一行的类型，用于检查区块与M300是否成对出现
+    lineNo = 0
+    for lineNo, record in enumerate(tokenizePrg(lines, options.numberLength, options.leadZero), 1):
+        kind = record.kind
+        if previous == PrgLine.BLOCK and kind != PrgLine.M300:
+            report('missingM300', lineNo - 1)
+        last, previous = previous, kind
+        if kind == PrgLine.BLOCK:
+            if record.value in seen:
+                report('duplicateBlocks', lineNo)
+            else:
+                seen.add(record.value)
+            blocks.append(record)
+            blockLines.append(lineNo)
+            toolBlocks += 1
+            glvLine = None
+            if flagIndex > -1:
+                glvFiles.setStart(flagIndex, record.value)
+                flagIndex = -1
+            glvFiles.lookup(record.value)
+        elif kind == PrgLine.M300:
+            if last != PrgLine.BLOCK:
+                report('strayM300', lineNo)
+        elif kind == PrgLine.GLV:
+            if glvLine is not None:
+                report('emptyGlvSwitches', glvLine)
+            glvFiles.addFile(record.value)
+            glvSeen.add(record.value)
+            flagIndex = record.value
+            glvLine = lineNo
+        elif kind == PrgLine.TOOL:
+            toolNum = 2 if 2 < record.value < 24 else record.value
+            if toolLine is not None and toolBlocks == 0:
+                report('emptyTools', toolLine)
+            toolLine = lineNo
+            toolBlocks = 0
+            if toolNum != curTool:
+                if blocks:
+                    flush(blocks, blockLines, curTool)
+                    blocks, blockLines = [], []
+                curTool = toolNum
+        else:
+            if record.text == '(Drilling Path Optimized)':
+                result['errors'].append('加工钻带已经优化过加工路径!')
+            elif record.text[:1] == 'N':
+                report('malformedBlocks', lineNo)
+            if blocks:
+                flush(blocks, blockLines, curTool)
+                blocks, blockLines = [], []
+    if previous == PrgLine.BLOCK:
+        report('missingM300', lineNo)
+    if blocks:
+        flush(blocks, blockLines, curTool)
+    if glvLine is not None:
+        report('emptyGlvSwitches', glvLine)
+    if toolLine is not None and toolBlocks == 0:
+        report('emptyTools', toolLine)
+    if 0 not in glvSeen and 'firsts' in glvState:
+        # 与rewritePrg相同，没有M900指令(GLV文件0)时第一个区块之前的GLV文件编号为0
+        result['originalGlvSwitches'] -= glvState['firsts'][0] == 0
+        result['spiralGlvSwitches'] -= glvState['firsts'][1] == 0
+    result['glvFiles'] = len(glvSeen)
+    result['originalCycleSeconds'] = options.cycleTime(result['originalTravel'], result['blocks'],
+                                                       result['originalGlvSwitches'])
+    result['spiralCycleSeconds'] = options.cycleTime(result['spiralTravel'], result['blocks'],
+                                                     result['spiralGlvSwitches'])
+    return result
+
+
+def validateFile(filePath, options=None):
+    """
+    检查单个钻带，只读取程式头检查钻带设置，设置正确时再遍历一次钻带内容，参见validatePrg
+    @param filePath: 钻带文件路径
+    @param options: OptimizeOptions设置，为None时使用默认设置
+    @return: validatePrg的检查结果，并增加钻带面次side及检查时间seconds，钻带设置不正确时只有errors
+    @rtype: dict
+    """
+    start = time.time()
+    if options is None:
+        options = OptimizeOptions()
+    result = {'errors': [], 'anomalies': {}}
+    isTopSide = prgSide(os.path.splitext(filePath)[0])
+    if isTopSide is None:
+        result['errors'].append('无法识别钻带面次')
+    else:
+        result['side'] = 'top' if isTopSide else 'bottom'
+        header = readHeader(filePath)
+        message = checkPrgMessage(isTopSide, header, options)
+        if message:
+            result['errors'].append(message)
+        else:
+            options = options.forProgram(header)
+            with PrgReader(filePath) as lines:
+                result.update(validatePrg((line.strip() for line in lines), isTopSide, options))
+            result['area'] = options.area
+    result['seconds'] = time.time() - start
+    return result
+
+
+class QueueWriter(object):
+    """将输出的钻带内容缓存后放入队列中，供另一线程读取，读取端关闭后再写入时抛出IOError"""
+
+    def __init__(self, closed, queueSize=64, bufferSize=65536):
+        """
+        初始化QueueWriter对象.
+        @param closed: 读取端关闭时设置的threading.Event
+        @param queueSize: 队列中等待读取的内容块个数，超过时写入端等待
+        @param bufferSize: 缓存的字符数，超过时放入队列
+        @return:None
+        """
+        try:
+            import queue
+        except ImportError:
+            import Queue as queue
+        self.chunks = queue.Queue(queueSize)
+        self.full = queue.Full
+        self.closed = closed
+        self.bufferSize = bufferSize
+        self.__buffer = []
+        self.__size = 0
+
+    def write(self, text):
+        self.__buffer.append(text)
+        self.__size += len(text)
+        if self.__size >= self.bufferSize:
+            self.flush()
+
+    def flush(self):
+        if self.__buffer:
+            self.put(''.join(self.__buffer))
+            self.__buffer = []
+            self.__size = 0
+
+    def put(self, item):
+        """将内容放入队列，队列已满时等待读取端读取"""
+        while True:
+            if self.closed.is_set():
+                raise IOError('Output stream closed')
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except self.full:
+                pass
+
+
+def decodeLines(lines):
+    """Python3中将bytes类型的行按latin-1解码为str"""
+    for line in lines:
+        if sys.version_info[0] > 2 and isinstance(line, bytes):
+            line = line.decode('latin-1')
+        yield line
+
+
+def spoolLines(lines):
+    """
+    将不能定位的钻带行迭代器写入SpooledTemporaryFile，较小的钻带只保存在内存中，超过SPOOL_SIZE时写入磁盘临时文件
+    没有换行符的行添加换行符，Python3中使用UTF-8编码的文本模式，bytes类型的行按latin-1解码
+    @param lines: 钻带内容的行迭代器
+    @return: 定位至开头的临时文件对象，使用后需要关闭
+    """
+    import tempfile
+    if sys.version_info[0] > 2:
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, mode='w+', encoding='utf-8', newline='')
+    else:
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    try:
+        for line in decodeLines(lines):
+            if not isinstance(line, str):
+                line = line.encode('utf-8')
+            spool.write(line if line.endswith('\n') else line+'\n')
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        raise
+    return spool
+
+
+def optimizeStream(lines, isTopSide, thickness, options=None, hasM900=None, stats=None, executor=None,
+                   headerLines=1000, queueSize=64):
+    """
+    优化钻带内容的生成器，不需要读写钻带文件，钻带在另一线程中处理，输出的内容按块依次yield
+    @param lines: 钻带内容，可以为行列表、行迭代器或已打开的文件对象，bytes类型的行按latin-1解码；
+                  不能定位的输入先写入spoolLines返回的临时文件，占用的内存不随钻带大小增加
+    @param isTopSide: 是否为正面钻带
+    @param thickness: 生产板板厚，如'2mil'、2或2.3
+    @param options: OptimizeOptions设置，为None时使用默认设置，其中的缓存、检查点及metrics设置不使用
+    @param hasM900: 钻带中是否有M900指令，为None时自动识别
+    @param stats: 不为None时在处理完成后更新为rewritePrg返回的统计结果
+    @param executor: 计算区块组顺序的进程池，参见rewritePrg
+    @param headerLines: 程式头最多读取的行数
+    @param queueSize: 等待读取的输出块个数，超过时暂停处理
+    @return: 该函数为生成器函数，每次yield一块以换行符结尾的钻带内容
+    @raise ValueError: 板厚不正确、钻带不满足路径优化要求，或者钻带已经优化过加工路径，均在输出第一块内容之前抛出
+    """
+    value = parseThickness(str(thickness))
+    if value is None:
+        raise ValueError('板厚大小不正确: '+str(thickness))
+    cond = thicknessCond(isTopSide, value)
+    if options is None:
+        options = OptimizeOptions()
+    # 已经优化过的备注在钻带末尾，输出之前需要预先扫描全部内容：可以定位的文件扫描后返回原位置，
+    # 其他迭代器先写入临时文件再扫描
+    spool = None
+    if not (hasattr(lines, 'seek') and hasattr(lines, 'read')):
+        lines = spool = spoolLines(lines)
+    try:
+        position = lines.tell()
+        found, optimized = scanPrg(lines)
+        lines.seek(position)
+        lines = iter(decodeLines(lines))
+        if hasM900 is None:
+            hasM900 = found
+
+        # 读取程式头检查钻带，钻带末尾只需检查是否已经优化过
+        header = []
+        for line in lines:
+            header.append(line)
+            line = line.strip()
+            if regTool.match(line) or regBlock.match(line) or regGlvIndex.match(line) or len(header) >= headerLines:
+                break
+        header = [line.strip() for line in header]
+        message = checkPrgMessage(isTopSide, header + (['(Drilling Path Optimized)'] if optimized else []), options)
+        if message:
+            raise ValueError(message)
+        options = options.forProgram(header)
+        lines = itertools.chain(header, lines)
+
+        import threading
+        closed = threading.Event()
+        writer = QueueWriter(closed, queueSize)
+        chunks = writer.chunks
+        result = {}
+
+        def produce():
+            try:
+                result['stats'] = rewritePrg(iterPrgLines(lines, cond), writer, isTopSide, hasM900, options,
+                                             executor=executor)
+                writer.flush()
+            except Exception as e:
+                result['error'] = e
+            if not closed.is_set():
+                writer.put(None)
+
+        thread = threading.Thread(target=produce)
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                text = chunks.get()
+                if text is None:
+                    break
+                yield text
+        finally:
+            # 读取端提前关闭时，处理线程在下一次输出时结束
+            closed.set()
+            thread.join()
+        if 'error' in result:
+            raise result['error']
+        if stats is not None:
+            stats.update(result['stats'])
+    finally:
+        if spool is not None:
+            spool.close()
+
+
+def optimizeProgram(lines, isTopSide, thickness, options=None, hasM900=None, stats=None, executor=None):
+    """
+    供其他程序调用的钻带优化接口，参数参见optimizeStream
+    @return: 该函数为生成器函数，每次yield优化后钻带中以换行符结尾的一行
+    @raise ValueError: 参见optimizeStream
+    """
+    rest = ''
+    for text in optimizeStream(lines, isTopSide, thickness, options, hasM900, stats, executor):
+        text = rest + text
+        end = text.rfind('\n') + 1
+        # latin-1解码后的内容中可能有splitlines识别为换行的字符，只按\n分行
+        for line in text[:end].split('\n')[:-1]:
+            yield line + '\n'
+        rest = text[end:]
+    if rest:
+        yield rest
+
+
+optimize_program = optimizeProgram
+
+
+def findPrgFiles(patterns):
+    """
+    根据文件名、目录或通配符查找需要处理的钻带文件，目录中查找所有.prg文件
+    @param patterns: 文件名、目录或通配符列表
+    @return: 排序并去重后的钻带文件列表
+    @rtype: list
+    """
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files.extend(glob.glob(os.path.join(pattern, '*.prg')))
+        elif glob.has_magic(pattern):
+            files.extend(glob.glob(pattern))
+        else:
+            files.append(pattern)
+    return sorted(set(os.path.normpath(f) for f in files))
+
+
+def readThicknessMap(filePath):
+    """
+    读取每个钻带的板厚设置，每行为钻带名及板厚，以空格、制表符或逗号分隔，#开头的行为注释
+    @return: 钻带名(不含扩展名)至板厚的字典
+    @rtype: dict
+    """
+    thicknessMap = {}
+    with open(filePath) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = re.split(r'[\s,]+', line)
+            if len(fields) != 2:
+                raise ValueError('板厚设置格式不正确: '+line)
+            thicknessMap[os.path.splitext(os.path.basename(fields[0]))[0]] = fields[1]
+    return thicknessMap
+
+
+def optimizeOptions(args):
+    """根据命令行参数返回OptimizeOptions设置"""
+    return OptimizeOptions(args.group_glv, args.travel, args.travel_time, args.stage_speed, args.dwell,
+                           not args.no_metrics, None if args.no_cache else args.cache_dir, args.cache_size,
+                           args.checkpoint, args.segment_workers, args.previous, args.area, args.machine,
+                           args.sub_grid, args.glv_switch_time, args.compact_grid, args.segment_index)
+
+
+def runBatch(args):
+    """
+    批量处理多个钻带文件，使用多个进程并行优化，单个钻带处理失败时不影响其他钻带
+    @param args: 命令行参数
+    @return: 所有钻带均处理成功时返回0，否则返回1
+    @rtype: int
+    """
+    files = findPrgFiles(args.paths)
+    thicknessMap = readThicknessMap(args.thickness_map) if args.thickness_map else {}
+    jobs = [(f, thicknessMap.get(os.path.splitext(os.path.basename(f))[0], args.thickness)) for f in files]
+
+    options = optimizeOptions(args)
+    # 指定--profile时使用profileFile，在处理钻带的进程中统计耗时
+    run, extra = optimizeFile, ()
+    if args.profile:
+        if not os.path.isdir(args.profile):
+            os.makedirs(args.profile)
+        run, extra = profileFile, (args.profile,)
+    results = {}
+    executor = processPool(args.workers) if args.workers > 1 and len(jobs) > 1 else None
+    if executor is not None:
+        from concurrent.futures import as_completed
+        with executor:
+            futures = dict((executor.submit(run, f, t, options, *extra), f) for f, t in jobs)
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    results[futures[future]] = e
+    else:
+        for f, t in jobs:
+            try:
+                results[f] = run(f, t, options, *extra)
+            except Exception as e:
+                results[f] = e
+
+    # 输出处理结果汇总表
+    width = max([len(f) for f in files] + [4])
+    print('{0:<{w}}  {1:<6} {2:>9} {3:>9} {4:>15} {5:>23} {6:>9} {7:>9}'.format(
+        'File', 'Status', 'Blocks', 'Moved', 'GLV switches', 'Travel(mm)', 'Saved(s)', 'Time(s)', w=width))
+    failed = 0
+    for f in files:
+        result = results[f]
+        if isinstance(result, Exception):
+            failed += 1
+            print(encode('{0:<{w}}  {1:<6} {2}'.format(f, 'FAIL', result, w=width)))
         else:
-            isTopSide = False
+            switches = '{0}->{1}'.format(result['spiralGlvSwitches'], result['glvSwitches'])
+            travel = '{0:.0f}->{1:.0f}'.format(result['spiralTravel'], result['travel'])
+            if result['cached']:
+                status = 'CACHED'
+            elif result.get('reusedBlocks'):
+                status = 'INCR'
+            else:
+                status = 'OK'
+            print('{0:<{w}}  {1:<6} {2:>9} {3:>9} {4:>15} {5:>23} {6:>9.1f} {7:>9.2f}'.format(
+                f, status, result['blocks'], result['moved'], switches, travel, result['savedSeconds'],
+                result['seconds'], w=width))
+    print('{0} files processed, {1} failed'.format(len(files), failed))
+    if args.profile:
+        for f in files:
+            if not isinstance(results[f], Exception):
+                printProfile(f, results[f]['profile'])
+    return 1 if failed else 0
+
+
+def runDryRun(args):
+    """
+    检查多个钻带文件并估算优化效果，不修改钻带，也不保存统计文件及缓存
+    @param args: 命令行参数
+    @return: 所有钻带均可以优化时返回0，否则返回1
+    @rtype: int
+    """
+    files = findPrgFiles(args.paths)
+    options = OptimizeOptions(stageSpeed=args.stage_speed, dwell=args.dwell, metrics=False, area=args.area,
+                              machine=args.machine, subGrid=args.sub_grid, glvSwitchTime=args.glv_switch_time,
+                              compactGrid=args.compact_grid)
+    results = {}
+    executor = processPool(args.workers) if args.workers > 1 and len(files) > 1 else None
+    if executor is not None:
+        from concurrent.futures import as_completed
+        with executor:
+            futures = dict((executor.submit(validateFile, f, options), f) for f in files)
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    results[futures[future]] = {'errors': [str(e)], 'anomalies': {}}
+    else:
+        for f in files:
+            try:
+                results[f] = validateFile(f, options)
+            except Exception as e:
+                results[f] = {'errors': [str(e)], 'anomalies': {}}
+
+    # 输出检查结果汇总表，之后列出每个钻带的错误及异常所在的行号
+    width = max([len(f) for f in files] + [4])
+    print('{0:<{w}}  {1:<6} {2:>9} {3:>5} {4:>5} {5:>7} {6:>23} {7:>15} {8:>9}'.format(
+        'File', 'Status', 'Blocks', 'Tools', 'GLV', 'Rings', 'Travel(mm)', 'Cycle(s)', 'Anomalies', w=width))
+    failed = 0
+    details = []
+    for f in files:
+        result = results[f]
+        anomalies = result['anomalies']
+        if result['errors']:
+            failed += 1
+            print(encode('{0:<{w}}  {1:<6} {2}'.format(f, 'FAIL', '; '.join(result['errors']), w=width)))
+            continue
+        travel = '{0:.0f}->{1:.0f}'.format(result['originalTravel'], result['spiralTravel'])
+        cycle = '{0:.0f}->{1:.0f}'.format(result['originalCycleSeconds'], result['spiralCycleSeconds'])
+        print('{0:<{w}}  {1:<6} {2:>9} {3:>5} {4:>5} {5:>7} {6:>23} {7:>15} {8:>9}'.format(
+            f, 'WARN' if anomalies else 'OK', result['blocks'], len(result['tools']), result['glvFiles'],
+            result['rings'], travel, cycle, sum(a['count'] for a in anomalies.values()), w=width))
+        for name in sorted(anomalies):
+            details.append('{0}: {1} x{2} (line {3})'.format(
+                f, name, anomalies[name]['count'], ', '.join(str(n) for n in anomalies[name]['lines'])))
+    for line in details:
+        print(line)
+    print('{0} files checked, {1} failed'.format(len(files), failed))
+    return 1 if failed else 0
+
+
+class OptimizeService(object):
+    """
+    本地钻带优化服务，保持计算区块组顺序的进程池，每个请求的钻带在单独的线程中处理并记录处理时间
+    同时处理的钻带数不超过workers，其余请求等待
+    """
+
+    def __init__(self, options, workers=1, maxJobs=100):
+        """
+        初始化OptimizeService对象.
+        @param options: 默认的OptimizeOptions设置，segmentWorkers大于1时创建常驻的进程池
+        @param workers: 同时处理的钻带数
+        @param maxJobs: 保留的最近处理记录个数
+        @return:None
+        """
+        self.options = options
+        self.executor = None
+        if options.segmentWorkers > 1:
+            self.executor = processPool(options.segmentWorkers)
+        self.maxJobs = maxJobs
+        import threading
+        self.__slots = threading.BoundedSemaphore(max(1, workers))
+        self.__lock = threading.Lock()
+        self.__jobs = collections.OrderedDict()
+        self.__nextId = 1
+
+    def jobOptions(self, glvWindow=None, travel=None):
+        """
+        返回单个请求使用的OptimizeOptions设置，未指定的参数使用默认设置
+        @raise ValueError: 移动路径算法名称不正确
+        """
+        options = self.options
+        return OptimizeOptions(options.glvWindow if glvWindow is None else glvWindow,
+                               options.travel if travel is None else travel, options.travelTime,
+                               options.stageSpeed, options.dwell, False, None, options.cacheSize, None,
+                               options.segmentWorkers, None, options.area, options.machine, options.subGrid,
+                               options.glvSwitchTime, options.compactGrid)
+
+    def optimize(self, lines, isTopSide, thickness, options=None, name=None):
+        """
+        新建处理记录并返回优化钻带的生成器，参数参见optimizeStream
+        @return: 返回(job, chunks)，job为处理记录，chunks为optimizeStream生成器，读取时才开始处理
+        @rtype: tuple(dict, generator)
+        """
+        with self.__lock:
+            job = {'id': self.__nextId, 'name': name, 'side': 'top' if isTopSide else 'bottom',
+                   'thickness': str(thickness), 'status': 'queued', 'received': time.time(), 'bytes': 0}
+            self.__nextId += 1
+            self.__jobs[job['id']] = job
+            while len(self.__jobs) > self.maxJobs:
+                self.__jobs.popitem(last=False)
+        return job, self.__run(job, lines, isTopSide, thickness, options)
+
+    def __run(self, job, lines, isTopSide, thickness, options):
+        """处理钻带并记录等待时间queueSeconds、首次输出时间firstByteSeconds、总时间seconds及统计结果"""
+        self.__slots.acquire()
+        try:
+            start = time.time()
+            job['queueSeconds'] = start - job['received']
+            job['status'] = 'running'
+            stats = {}
+            try:
+                for text in optimizeStream(lines, isTopSide, thickness, options or self.options, stats=stats,
+                                           executor=self.executor):
+                    if 'firstByteSeconds' not in job:
+                        job['firstByteSeconds'] = time.time() - start
+                    job['bytes'] += len(text)
+                    yield text
+            except GeneratorExit:
+                job['status'] = 'cancelled'
+                raise
+            except Exception as e:
+                job['status'] = 'failed'
+                job['error'] = str(e)
+                raise
+            job['status'] = 'done'
+            job['stats'] = stats
+        finally:
+            job['seconds'] = time.time() - start
+            self.__slots.release()
 
-        # 读取钻带内容并按行保存至prg的列表中，删除每行头尾的空字符和换行符
-        prg = []
-        with open(name+ext) as f:
-            for line in f:
-                prg.append(line.strip())
+    def job(self, jobId):
+        """返回处理记录，不存在时返回None"""
+        with self.__lock:
+            return self.__jobs.get(jobId)
 
-        # 检查钻带是否符合钻带转换要求
+    def jobs(self):
+        """返回最近的处理记录列表"""
+        with self.__lock:
+            return list(self.__jobs.values())
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def makeServer(service, host='127.0.0.1', port=8765):
+    """
+    创建本地HTTP服务，请求的钻带内容先保存至临时文件再处理，优化后的钻带使用chunked编码边处理边返回
+      POST /optimize?side=top|bottom&thickness=2&group-glv=0&travel=nn   请求内容为钻带，也可以用name=lsrXXYY识别面次
+      GET /jobs            最近的处理记录列表
+      GET /jobs/<id>       单个处理记录，包括处理时间及统计结果，id为POST返回的X-Job-Id
+    @param service: OptimizeService对象
+    @return: 尚未启动的服务对象，调用serve_forever()开始处理请求
+    """
+    try:
+        from http.server import HTTPServer, BaseHTTPRequestHandler
+        from socketserver import ThreadingMixIn
+        from urllib.parse import urlparse, parse_qs
+    except ImportError:
+        from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+        from SocketServer import ThreadingMixIn
+        from urlparse import urlparse, parse_qs
+    import tempfile
+
+    def toBytes(s):
+        return s if isinstance(s, bytes) else s.encode('utf-8')
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def sendText(self, code, text, contentType='text/plain; charset=utf-8'):
+            body = toBytes(text)
+            self.send_response(code)
+            self.send_header('Content-Type', contentType)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def sendJson(self, code, obj):
+            self.sendText(code, json.dumps(obj, indent=2, sort_keys=True, separators=(',', ': ')),
+                          'application/json')
+
+        def do_GET(self):
+            path = urlparse(self.path).path.rstrip('/')
+            if path == '/jobs':
+                self.sendJson(200, service.jobs())
+                return
+            match = re.match(r'^/jobs/(\d+)$', path)
+            job = service.job(int(match.group(1))) if match else None
+            if job is None:
+                self.sendText(404, 'Not found\n')
+            else:
+                self.sendJson(200, job)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path.rstrip('/') != '/optimize':
+                self.sendText(404, 'Not found\n')
+                return
+            if self.headers.get('Content-Length') is None:
+                self.sendText(411, 'Content-Length required\n')
+                return
+            query = dict((k, v[-1]) for k, v in parse_qs(url.query).items())
+            size = int(self.headers.get('Content-Length'))
+            # 请求内容保存至临时文件，以便预先扫描M900指令，较小的钻带只保存在内存中
+            body = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+            try:
+                while size > 0:
+                    data = self.rfile.read(min(size, 1048576))
+                    if not data:
+                        break
+                    body.write(data)
+                    size -= len(data)
+                body.seek(0)
+                self.optimize(query, body)
+            finally:
+                body.close()
+
+        def optimize(self, query, body):
+            name = query.get('name')
+            side = query.get('side')
+            try:
+                if side is not None:
+                    if side not in ('top', 'bottom'):
+                        raise ValueError('side must be top or bottom')
+                    isTopSide = side == 'top'
+                else:
+                    isTopSide = prgSide(name or '')
+                    if isTopSide is None:
+                        raise ValueError('无法识别钻带面次')
+                glvWindow = int(query['group-glv']) if 'group-glv' in query else None
+                options = service.jobOptions(glvWindow, query.get('travel'))
+                job, chunks = service.optimize(body, isTopSide, query.get('thickness', '2'), options, name)
+                # 读取第一块输出后再返回状态码，钻带检查失败时返回400
+                first = next(chunks, '')
+            except ValueError as e:
+                self.sendText(400, str(e)+'\n')
+                return
+            except Exception as e:
+                self.sendText(500, str(e)+'\n')
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; charset=latin-1')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.send_header('X-Job-Id', str(job['id']))
+            self.end_headers()
+            try:
+                for text in itertools.chain([first], chunks):
+                    if text:
+                        data = text.encode('latin-1') if sys.version_info[0] > 2 else text
+                        self.wfile.write(('%x\r\n' % len(data)).encode('ascii') + data + b'\r\n')
+                self.wfile.write(b'0\r\n\r\n')
+            except Exception:
+                # 处理失败或客户端断开时只能关闭连接，处理记录中保存错误信息
+                chunks.close()
+                self.close_connection = True
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    return Server((host, port), Handler)
+
+
+def serve(args):
+    """
+    启动本地钻带优化服务，处理请求直至按下Ctrl+C
+    @param args: 命令行参数
+    @return: 0
+    @rtype: int
+    """
+    service = OptimizeService(optimizeOptions(args), args.workers)
+    server = makeServer(service, args.host, args.port)
+    print('Serving on http://{0}:{1}/optimize'.format(*server.server_address[:2]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+def parseArea(s):
+    """识别命令行中的扫描区域大小，如 50x50、50x20 或 50，返回(x, y)"""
+    values = [float(v) for v in re.split(r'[xX*,]', s)]
+    if len(values) == 1:
+        values *= 2
+    if len(values) != 2 or values[0] <= 0 or values[1] <= 0:
+        raise ValueError('Invalid scan area: '+s)
+    return tuple(values)
+
+
+def parseArgs(argv):
+    """解析批量处理模式的命令行参数"""
+    import argparse
+    import multiprocessing
+    parser = argparse.ArgumentParser(description='三菱镭射机加工程序路径优化程序(批量处理模式)')
+    parser.add_argument('paths', nargs='*', help='钻带文件、目录或通配符')
+    parser.add_argument('-t', '--thickness', default='2', help='生产板板厚，默认为2mil')
+    parser.add_argument('-m', '--thickness-map', help='每个钻带的板厚设置文件')
+    parser.add_argument('-j', '--workers', type=int, default=multiprocessing.cpu_count(),
+                        help='并行处理的进程数，默认为CPU核数')
+    parser.add_argument('-g', '--group-glv', type=int, default=0, metavar='RINGS',
+                        help='将每RINGS层回形路径中的区块按GLV文件分组，以减少M90x切换次数，默认为0不分组')
+    parser.add_argument('--travel', choices=sorted(travelHeuristics),
+                        help='在每层回形路径内重新排列区块以缩短平台移动距离，默认保持原有回形路径')
+    parser.add_argument('--travel-time', type=float, metavar='SECONDS',
+                        help='每个钻带计算移动路径的时间限制，超时后剩余部分只使用最近邻算法')
+    parser.add_argument('--stage-speed', type=float, default=300.0, metavar='MM/S',
+                        help='平台的平均移动速度，用于估算加工时间，默认为300mm/s')
+    parser.add_argument('--dwell', type=float, default=0.05, metavar='SECONDS',
+                        help='每个M300区块加工指令的停留时间，用于估算加工时间，默认为0.05秒')
+    parser.add_argument('--glv-switch-time', type=float, default=0.5, metavar='SECONDS',
+                        help='每次M90x切换GLV文件的耗时，用于估算加工时间，默认为0.5秒')
+    parser.add_argument('--no-metrics', action='store_true', help='不保存钻带的.metrics.json统计文件')
+    parser.add_argument('--no-cache', action='store_true', help='不使用优化结果缓存，总是重新计算加工路径')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='优化结果缓存目录，默认为'+CACHE_DIR)
+    parser.add_argument('--cache-size', type=int, default=256, metavar='MB',
+                        help='缓存的最大容量，超过时删除最久未使用的结果，默认为256MB')
+    parser.add_argument('-s', '--segment-workers', type=int, default=1,
+                        help='并行计算单个钻带中各刀具区块顺序的进程数，默认为1，处理少量大钻带时可与-j 1一起使用')
+    parser.add_argument('--checkpoint', type=float, default=60, metavar='SECONDS',
+                        help='每隔SECONDS秒在刀具切换处保存处理进度，中断后再次处理时继续，默认为60秒，0为不保存')
+    parser.add_argument('--area', type=parseArea, metavar='XxY',
+                        help='扫描区域大小(mm)，如 50x50 或 50x20，用作划分回形路径的Cell间隔，默认使用钻带程式头中的Area设置')
+    parser.add_argument('--sub-grid', type=parseArea, metavar='XxY',
+                        help='Cell内子Grid的大小(mm)，如 5x5，每个Cell中的区块也按子Grid从外向内的回形路径加工，默认按钻带中的顺序')
+    parser.add_argument('--compact-grid', action='store_true',
+                        help='未安装NumPy时使用紧凑数组保存Grid中的区块，输出结果相同，适合内存有限时处理大钻带')
+    parser.add_argument('--machine', metavar='NAME|JSON',
+                        help='镭射机的钻带格式设置({0})或JSON文件，包含坐标格式numberLength、leadZero及默认扫描区域area'.format(
+                            ', '.join(sorted(machineProfiles))))
+    parser.add_argument('--segment-index', action='store_true',
+                        help='在钻带旁保存.segments索引文件，之后修改钻带时可以使用--previous增量优化，使用--previous时总是保存')
+    parser.add_argument('--previous', metavar='DIR',
+                        help='上一次优化结果所在的目录，根据其中同名钻带的.segments索引文件，未修改的区块组直接使用之前的顺序')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='使用cProfile统计每个钻带的耗时，并统计热点函数的调用次数及耗时分布，统计文件保存在DIR中，'
+                             '处理完成后列出每个钻带中耗时最多的函数')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='只检查钻带并估算回形路径层数及平台移动距离，不修改钻带，可使用--area、--machine及加工时间参数')
+    parser.add_argument('--serve', action='store_true',
+                        help='启动本地HTTP优化服务，POST /optimize提交钻带并返回优化后的钻带，-j为同时处理的钻带数')
+    parser.add_argument('--host', default='127.0.0.1', help='服务监听的地址，默认为127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765, help='服务监听的端口，默认为8765')
+    args = parser.parse_args(argv)
+    if not args.paths and not args.serve:
+        parser.error('需要指定钻带文件、目录或通配符')
+    try:
+        loadMachineProfile(args.machine)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.profile and args.segment_workers > 1:
+        # 区块组在子进程中计算顺序时，cProfile及热点函数统计只包括当前进程
+        parser.error('--profile不能与-s/--segment-workers同时使用')
+    return args
+
+
+def interactiveOptions():
+    """
+    返回交互模式使用的OptimizeOptions设置，默认不使用优化结果缓存，也不保存检查点
+    设置了环境变量LASERPRG_CACHE_DIR时使用其中的缓存目录(为空时使用CACHE_DIR)，
+    设置了LASERPRG_CHECKPOINT时每隔该秒数保存检查点，不是数字时不保存
+    @rtype: OptimizeOptions
+    """
+    cacheDir = os.environ.get('LASERPRG_CACHE_DIR')
+    if cacheDir is not None:
+        cacheDir = cacheDir or CACHE_DIR
+    try:
+        checkpoint = float(os.environ.get('LASERPRG_CHECKPOINT', 0))
+    except ValueError:
+        checkpoint = 0
+    return OptimizeOptions(cacheDir=cacheDir, checkpoint=checkpoint or None)
+
+
+def runInteractive(filePath=None):
+    """
+    交互模式，依次输入钻带程序名和生产板板厚，输入空的钻带程序名时退出
+    @param filePath: 命令行中指定的第一个钻带程序名
+    @return: 0
+    @rtype: int
+    """
+    while True:
+        # 获取钻带文件名
+        if not filePath:
+            filePath = input(encode('请输入钻带程序名：'))
+        if not filePath:
+            return 0
+        name, ext = os.path.splitext(filePath)
+        filePath = None
+        ext = '.prg'
+        if not os.path.isfile(name+ext):
+            print(encode('钻带程序未找到: '+name+ext+'\n'))
+            continue
+
+        # 从钻带文件名中判断钻带的面次
+        isTopSide = prgSide(name)
+        if isTopSide is None:
+            print(encode('无法识别钻带面次: '+name+ext+'\n'))
+            continue
+
+        # 只读取程式头及钻带末尾，检查钻带是否符合钻带转换要求
+        prg, hasM900 = sniffPrg(name+ext)
         if checkPrg(isTopSide, prg)==False:
             print('\n')
             continue
 
         # 在钻带程式头添加参数
-        flag = True
-        while flag:
-            cond = input(encode('请输入生产板板厚(默认为2mil):'))
-            cond = cond.lower().replace('mil', '').replace('2.0', '2').strip()
-            if not cond:
-                cond = '2'
-            if cond == '2' or cond == '2.3':
-                flag = False
-            else:
+        thickness = None
+        while thickness is None:
+            thickness = parseThickness(input(encode('请输入生产板板厚(默认为2mil):')))
+            if thickness is None:
                 print(encode('板厚大小不正确！\n'))
-        if isTopSide:
-            cond = r"M100(1st-ldd8um-{0}mil-core-2'4mil)".format(cond)
-        else:
-            cond = r"M100(2nd-ldd8um-{0}mil-core-2'4mil)".format(cond)
+        cond = thicknessCond(isTopSide, thickness)
         print(encode('程式头添加参数：'+cond))
-        prg.insert(1, cond)
-
-        # 钻带末尾添加执行路径优化的备注
-        print(encode('正在优化钻带加工路径:'), name+ext)
-        prg.insert(-1, '(Drilling Path Optimized)')
-
-        # 重写镭射机加工程序至临时文件中
-        curTool = 0                 # 当前区块的刀具编号
-        curBlock = 0                # 当前的区块编号
-        curGlvIndex = 0             # 当前区块所在的GLV文件编号
-        if 'M900' in prg:
-            curGlvIndex=-1          # 当钻带中有GLV文件切换指令时才增加切换指令，单个GLV文件不添加M90x指令
-        glvFiles = [1]              # 保存每个GLV文件中起始区块编号的列表，处理过程中根据M90x指令自动识别更新
-        grid = GridData(30, 30)     # 按照30mm*30mm的间隔划分每个回形加工路径间隔
-        grid.posParser = parseBlockXY
-        regBlock = re.compile(r'N(\d+)G1X-?\d+Y-?\d+')
-        regTool = re.compile(r'M1(0[1-9]|[1-4]\d|50)')
-        regGlvIndex = re.compile(r'M9(0\d)')
-        flagIndex = -1
-
-        with open(name+'.tmp', 'w') as f:
-            for line in prg:
-                if regTool.match(line):
-                    # 识别刀具切换指令
-                    toolNum = int(regTool.match(line).groups()[0])
-                    # 将T03-T23合并为T02
-                    if 2 < toolNum < 24:
-                        toolNum = 2
-                    if toolNum != curTool:
-                        if grid.countItems() > 0:
-                            curGlvIndex = outputBlock(
-                                f, grid, curGlvIndex, glvFiles, isTopSide)
-                        curTool = toolNum
-                        f.write('M1'+str(curTool).zfill(2)+'\n')
-                elif regBlock.match(line):
-                    # 识别区块指令
-                    curBlock = int(regBlock.match(line).groups()[0])
-                    grid.addItem(line)
-                    # 如果前一个指令为Glv切换指令，则更新glv区块文件域值列表
-                    if flagIndex > -1:
-                        if curBlock < glvFiles[flagIndex]:
-                            glvFiles[flagIndex] = curBlock
-                        flagIndex = -1
-                elif line == 'M300':
-                    # 识别区块加工执行指令，输出优化后区块路径时可以自动添加，故删除原M300指令
-                    pass
-                elif regGlvIndex.match(line):
-                    # 识别Glv数据文件切换指令
-                    glvIndex = int(regGlvIndex.match(line).groups()[0])
-                    while glvIndex >= len(glvFiles):
-                        glvFiles.append(999999)
-                    flagIndex = glvIndex
-                else:
-                    if grid.countItems() > 0:
-                        curGlvIndex = outputBlock(
-                            f, grid, curGlvIndex, glvFiles, isTopSide)
-                    f.write(line+'\n')
 
+        # 逐行重写镭射机加工程序至临时文件中，钻带末尾添加执行路径优化的备注
         # 将原始钻带文件备份为.bak文件, 用生成的临时钻带替换原始钻带
-        os.rename(name+ext, name+'.bak')
-        os.rename(name+'.tmp', name+ext)
+        print(encode('正在优化钻带加工路径:'), name+ext)
+        stats = rewriteFile(name+ext, isTopSide, cond, hasM900, interactiveOptions())
+        print(encode('区块数: {0}  回形路径层数: {1}  GLV切换次数: {2}'.format(
+            stats['blocks'], stats['rings'], stats['glvSwitches'])))
+        print(encode('平台移动距离: {0:.0f}mm -> {1:.0f}mm  估算加工时间: {2:.0f}s -> {3:.0f}s'.format(
+            stats['originalTravel'], stats['travel'], stats['originalCycleSeconds'], stats['cycleSeconds'])))
         print(encode('\n==== 钻带优化已经完成! ====\n\n'))
+
+
+def main(argv):
+    """
+    命令行入口，命令行中有选项参数或多个钻带时使用批量处理模式，否则使用交互模式
+    @param argv: 不含程序名的命令行参数
+    @return: 程序的退出状态
+    @rtype: int
+    """
+    if len(argv) > 1 or any(arg.startswith('-') for arg in argv):
+        args = parseArgs(argv)
+        if args.serve:
+            return serve(args)
+        return runDryRun(args) if args.dry_run else runBatch(args)
+    return runInteractive(argv[0] if argv else None)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
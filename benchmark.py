@@ -0,0 +1,574 @@
+#!/usr/bin/python
+# -*-coding:utf-8-*-
+
+# Compatible with python2 and python3
+from __future__ import print_function
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import timeit
+import argparse
+import tempfile
+import subprocess
+
+from LaserPrgOptimizer import (GridData, CompactGridData, parseBlockXY, optimizeBlockOrder,
+                               numpyBlockOrder, sortBlocks, loadNumpy, tokenizePrg, PrgLine,
+                               OptimizeOptions, rewriteFile, sniffPrg, thicknessCond, prgSide, blockOrder,
+                               pathLength)
+
+# 本次运行的测试结果，测试名称至耗时(秒)或内存(KB)，可保存为JSON文件并与之前的结果比较
+results = {}
+
+# 交互模式冷启动(直接运行LaserPrgOptimizer.py至等待输入钻带程序名)的时间上限(秒)
+STARTUP_BUDGET = 0.25
+# CompactGridData建立偏移表后相对GridData的最小内存减少倍数，分别为保存区块指令及只保存区块索引的方式
+MEMORY_MIN_RATIO = {'blocks': 2.0, 'indexes': 3.0}
+# 交互模式启动时不应导入的模块，只在选择对应的处理模式时才导入
+HEAVY_MODULES = ('numpy', 'argparse', 'multiprocessing', 'concurrent.futures', 'threading', 'http.server')
+
+
+# DocString type: epydoc
+
+def generateBlocks(count, span=20, seed=0):
+    """
+    生成用于性能测试的三菱机区块指令
+    @param count: 需要生成的区块数量
+    @type count: int
+    @param span: 区块坐标在X,Y方向上分布的30mm区间个数
+    @type span: int
+    @param seed: 随机数种子，相同的种子生成相同的区块
+    @type seed: int
+    @return: 区块指令的列表，如 ['N1G1X10000Y-20000', ...]
+    @rtype: list
+    """
+    r = random.Random(seed)
+    blocks = []
+    for n in range(1, count+1):
+        x = r.randint(0, span) * 30000 + r.randint(-14000, 14000)
+        y = -r.randint(0, span) * 30000 + r.randint(-14000, 14000)
+        blocks.append('N{0}G1X{1}Y{2}'.format(n, x, y))
+    return blocks
+
+
+class RescanGridData(GridData):
+    """每次调用countItems时重新遍历所有Cell统计元素个数的GridData，用于对比计数缓存的性能"""
+
+    def countItems(self, column=None, row=None):
+        count = 0
+        if column is None and row is None:
+            for c in range(self.width):
+                for r in range(self.height):
+                    count += GridData.countItems(self, c, r)
+        elif column is None:
+            for c in range(self.width):
+                count += GridData.countItems(self, c, row)
+        elif row is None:
+            for r in range(self.height):
+                count += GridData.countItems(self, column, r)
+        else:
+            count = GridData.countItems(self, column, row)
+        return count
+
+
+def runOrder(gridClass, blocks):
+    """
+    模拟主程序的处理流程：逐个添加区块并在每次添加时检查元素个数，最后按优化路径取出全部区块
+    @param gridClass: 用于保存区块的GridData类
+    @param blocks: 区块指令的列表
+    @return: 优化后的区块输出顺序
+    @rtype: list
+    """
+    grid = gridClass(30, 30)
+    grid.posParser = parseBlockXY
+    for block in blocks:
+        grid.countItems()
+        grid.addItem(block)
+    return list(optimizeBlockOrder(grid, True))
+
+
+def benchCountItems(sizes=(1000, 5000, 20000), repeat=3):
+    """对比计数缓存与重新遍历Cell两种countItems实现的耗时"""
+    print('{0:>10} {1:>12} {2:>12} {3:>8}'.format('blocks', 'rescan(s)', 'cached(s)', 'speedup'))
+    for size in sizes:
+        blocks = generateBlocks(size)
+        if runOrder(RescanGridData, blocks) != runOrder(GridData, blocks):
+            raise AssertionError('Output order mismatch for {0} blocks'.format(size))
+        rescan = min(timeit.repeat(lambda: runOrder(RescanGridData, blocks), number=1, repeat=repeat))
+        cached = min(timeit.repeat(lambda: runOrder(GridData, blocks), number=1, repeat=repeat))
+        print('{0:>10} {1:>12.4f} {2:>12.4f} {3:>7.1f}x'.format(size, rescan, cached, rescan/cached))
+
+
+def buildByAddItem(blocks):
+    """逐个调用addItem添加区块创建GridData"""
+    grid = GridData(30, 30)
+    grid.posParser = parseBlockXY
+    for block in blocks:
+        grid.addItem(block)
+    return grid
+
+
+def benchFromItems(spans=(20, 80, 160), repeat=3):
+    """对比逐个addItem与fromItems一次性创建Grid的耗时，区块按照向X,Y负方向扩展的最差顺序排列"""
+    print('{0:>10} {1:>12} {2:>12} {3:>8}'.format('span', 'addItem(s)', 'fromItems(s)', 'speedup'))
+    for span in spans:
+        blocks = generateBlocks(span*span, span=span)
+        blocks.sort(key=parseBlockXY, reverse=True)
+        grid = GridData.fromItems(blocks, 30, 30, parseBlockXY)
+        if list(optimizeBlockOrder(grid)) != list(optimizeBlockOrder(buildByAddItem(blocks))):
+            raise AssertionError('Grid content mismatch for span {0}'.format(span))
+        incremental = min(timeit.repeat(lambda: buildByAddItem(blocks), number=1, repeat=repeat))
+        bulk = min(timeit.repeat(lambda: GridData.fromItems(blocks, 30, 30, parseBlockXY), number=1, repeat=repeat))
+        print('{0:>10} {1:>12.4f} {2:>12.4f} {3:>7.1f}x'.format(span, incremental, bulk, incremental/bulk))
+
+
+def measureMemory(func):
+    """
+    使用tracemalloc统计函数返回对象占用的内存
+    @param func: 无参数函数，其返回值在统计期间保持引用
+    @return: 返回值占用的内存字节数
+    @rtype: int
+    """
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        result = func()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def builtGrid(grid):
+    """查询一次Cell中的元素个数，使CompactGridData建立CSR偏移表后再统计内存，返回grid本身"""
+    grid.countItems(0, 0)
+    return grid
+
+
+def benchMemory(sizes=(10000, 100000, 500000), minRatio=MEMORY_MIN_RATIO):
+    """
+    对比GridData与CompactGridData保存区块时占用的内存，均在建立偏移表后统计
+    blocks为保存区块指令的方式(fromItems)，indexes为blockOrder使用--compact-grid时只保存区块索引的方式(fromPositions)
+    @param minRatio: 每种方式中CompactGridData相对GridData的最小内存减少倍数
+    @return: 内存减少倍数低于minRatio的检查项数量
+    @rtype: int
+    """
+    if sys.version_info[0] == 2:
+        print('tracemalloc is not available in python2')
+        return 0
+    failures = 0
+    print('{0:>10} {1:>8} {2:>14} {3:>14} {4:>8}'.format('blocks', 'items', 'GridData(KB)', 'Compact(KB)', 'ratio'))
+    for size in sizes:
+        positions = [parseBlockXY(b) for b in generateBlocks(size)]
+        cases = (
+            ('blocks',
+             lambda: builtGrid(GridData.fromItems(iter(generateBlocks(size)), 30, 30, parseBlockXY)),
+             lambda: builtGrid(CompactGridData.fromItems(iter(generateBlocks(size)), 30, 30, parseBlockXY))),
+            ('indexes',
+             lambda: builtGrid(GridData.fromItems(range(size), 30, 30, positions.__getitem__)),
+             lambda: builtGrid(CompactGridData.fromPositions(positions, 30, 30))),
+        )
+        for items, plainGrid, compactGrid in cases:
+            plain = measureMemory(plainGrid)
+            compact = measureMemory(compactGrid)
+            ratio = float(plain)/compact
+            results['memory/{0}/{1}'.format(items, size)] = compact/1024.0
+            flag = ''
+            if ratio < minRatio[items]:
+                failures += 1
+                flag = '  BELOW {0}x'.format(minRatio[items])
+            print('{0:>10} {1:>8} {2:>14.0f} {3:>14.0f} {4:>7.1f}x{5}'.format(size, items, plain/1024.0,
+                                                                             compact/1024.0, ratio, flag))
+    return failures
+
+
+def benchNumpyOrder(cases=((200000, 20), (200000, 3)), repeat=3):
+    """对比optimizeBlockOrder生成器与numpyBlockOrder计算加工顺序的耗时，span较小时每个Cell中的区块较多"""
+    if loadNumpy() is None:
+        print('numpy is not installed')
+        return
+    print('{0:>10} {1:>6} {2:>12} {3:>12} {4:>8}'.format('blocks', 'span', 'grid(s)', 'numpy(s)', 'speedup'))
+    for size, span in cases:
+        blocks = generateBlocks(size, span=span)
+        positions = [parseBlockXY(b) for b in blocks]
+        if sortBlocks(blocks, 30, 30) != list(optimizeBlockOrder(GridData.fromItems(blocks, 30, 30, parseBlockXY))):
+            raise AssertionError('Output order mismatch for span {0}'.format(span))
+        positionOf = dict(zip(blocks, positions))
+        grid = min(timeit.repeat(lambda: list(optimizeBlockOrder(GridData.fromItems(blocks, 30, 30, positionOf.get))),
+                                 number=1, repeat=repeat))
+        vectorized = min(timeit.repeat(lambda: numpyBlockOrder(positions, 30, 30), number=1, repeat=repeat))
+        print('{0:>10} {1:>6} {2:>12.4f} {3:>12.4f} {4:>7.1f}x'.format(size, span, grid, vectorized, grid/vectorized))
+
+
+def benchDenseCells(sizes=(20000, 100000, 200000), subPitch=(5, 5), repeat=3):
+    """
+    测试全部区块位于同一个Cell时的加工顺序计算耗时，以及按子Grid回形路径排列Cell中区块的耗时和平台移动距离
+    每个Cell中的区块保存在deque中，逐个取出时不再因为移动列表元素而使耗时随区块数平方增长
+    """
+    print('{0:>10} {1:>12} {2:>12} {3:>14} {4:>14}'.format('blocks', 'grid(s)', 'subgrid(s)', 'travel(mm)',
+                                                          'subgrid(mm)'))
+    for size in sizes:
+        blocks = generateBlocks(size, span=0)
+        positions = [parseBlockXY(b) for b in blocks]
+        grid = timeBest(lambda: list(optimizeBlockOrder(GridData.fromItems(range(size), 30, 30, positions.__getitem__))),
+                        repeat)
+        sub = timeBest(lambda: blockOrder(positions, 30, 30, subPitch=subPitch), repeat)
+        print('{0:>10} {1:>12.4f} {2:>12.4f} {3:>14.0f} {4:>14.0f}'.format(
+            size, grid, sub, pathLength(positions, blockOrder(positions, 30, 30)),
+            pathLength(positions, blockOrder(positions, 30, 30, subPitch=subPitch))))
+
+
+def generateProgram(blockCount, tools=(1, 2, 5), glvFiles=1, isTopSide=True, span=20, seed=0):
+    """
+    逐行生成用于性能测试的三菱机钻带的生成器，钻带中不包含客户资料，可以生成任意大小的钻带
+    每个刀具包含相同数量的区块，区块按编号平均分配至glvFiles个GLV文件，GLV文件变化时输出M90x指令
+    @param blockCount: 区块总数，钻带行数约为区块数的2倍
+    @param tools: 刀具编号(1-50)的列表，对应M101-M150指令
+    @param glvFiles: 每个刀具中的GLV文件个数(1-10)
+    @param isTopSide: 是否生成正面钻带，正面钻带关闭X MIRROR，反面钻带开启X MIRROR
+    @param span: 区块坐标在X,Y方向上分布的30mm区间个数
+    @param seed: 随机数种子，相同的参数生成相同的钻带
+    @return: 该函数为生成器函数，每次yield一行钻带内容(不含换行符)
+    """
+    if not tools or any(not 1 <= tool <= 50 for tool in tools):
+        raise ValueError('Tool numbers must be within 1-50')
+    if not 1 <= glvFiles <= 10:
+        raise ValueError('GLV file count must be within 1-10')
+    r = random.Random(seed)
+    yield '%'
+    yield '(BEST DIVISION:SP1_DIV)'
+    yield '(Area:X=30.000,Y=30.000)'
+    yield '(X MIRROR:OFF)' if isTopSide else '(X MIRROR:ON)'
+    size = (blockCount + len(tools) - 1) // len(tools)
+    n = 0
+    for i, tool in enumerate(tools):
+        count = min(size, blockCount - i*size)
+        if count <= 0:
+            break
+        yield 'M1{0:02d}'.format(tool)
+        glvIndex = -1
+        for k in range(count):
+            if k * glvFiles // count != glvIndex:
+                glvIndex = k * glvFiles // count
+                yield 'M9{0:02d}'.format(glvIndex)
+            n += 1
+            x = r.randint(0, span) * 30000 + r.randint(-14000, 14000)
+            y = -r.randint(0, span) * 30000 + r.randint(-14000, 14000)
+            yield 'N{0}G1X{1}Y{2}'.format(n, x, y)
+            yield 'M300'
+    yield 'G04'
+    yield 'M30'
+    yield '%'
+
+
+def writeProgram(filePath, blockCount, **kwargs):
+    """
+    将generateProgram生成的钻带逐行写入文件，参数与generateProgram相同
+    @param filePath: 钻带文件路径，文件名中需包含lsrXXYY以识别面次，如 lsr0102.prg
+    @return: None
+    """
+    with open(filePath, 'w') as f:
+        for line in generateProgram(blockCount, **kwargs):
+            f.write(line+'\n')
+
+
+def generatePrgLines(blockCount, tools=(1, 2, 5), seed=0):
+    """
+    生成用于性能测试的钻带内容，每个刀具包含相同数量的区块，每个区块后为M300指令
+    @param blockCount: 区块总数，钻带行数约为区块数的2倍
+    @return: 钻带内容的行列表
+    @rtype: list
+    """
+    return list(generateProgram(blockCount, tools, seed=seed))
+
+
+def legacyClassify(lines):
+    """按照原有方式逐个尝试正则表达式识别每行钻带，并在解析区块坐标和区块编号时重复匹配，用于对比tokenizePrg的性能"""
+    regBlock = re.compile(r'N(\d+)G1X-?\d+Y-?\d+')
+    regTool = re.compile(r'M1(0[1-9]|[1-4]\d|50)')
+    regGlvIndex = re.compile(r'M9(0\d)')
+    count = 0
+    for line in lines:
+        if regTool.match(line):
+            int(regTool.match(line).groups()[0])
+        elif regBlock.match(line):
+            int(regBlock.match(line).groups()[0])
+            parseBlockXY(line)
+            int(re.compile(r'N(\d+)G1X-?\d+Y-?\d+').match(line).groups()[0])
+            count += 1
+        elif line == 'M300':
+            pass
+        elif regGlvIndex.match(line):
+            int(regGlvIndex.match(line).groups()[0])
+    return count
+
+
+def benchTokenizer(blockCount=500000, repeat=3):
+    """对比原有逐个正则匹配方式与tokenizePrg单次识别方式每秒处理的钻带行数"""
+    lines = generatePrgLines(blockCount)
+    if legacyClassify(lines) != sum(1 for r in tokenizePrg(lines) if r.kind == PrgLine.BLOCK):
+        raise AssertionError('Block count mismatch')
+    legacy = min(timeit.repeat(lambda: legacyClassify(lines), number=1, repeat=repeat))
+    tokenizer = min(timeit.repeat(lambda: sum(1 for r in tokenizePrg(lines)), number=1, repeat=repeat))
+    print('{0:>10} {1:>16} {2:>16} {3:>8}'.format('lines', 'legacy(lines/s)', 'tokenize(lines/s)', 'speedup'))
+    print('{0:>10} {1:>16.0f} {2:>16.0f} {3:>7.1f}x'.format(
+        len(lines), len(lines)/legacy, len(lines)/tokenizer, legacy/tokenizer))
+
+
+def timeBest(func, repeat):
+    """返回多次执行函数的最短耗时"""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def benchHotPaths(sizes=(1000, 100000, 1000000), repeat=3):
+    """测试parseBlockXY、GridData.addItem及optimizeBlockOrder三个热点函数在不同区块数量下的耗时"""
+    print('{0:>10} {1:>14} {2:>14} {3:>14}'.format('blocks', 'parse(s)', 'addItem(s)', 'order(s)'))
+    for size in sizes:
+        blocks = generateBlocks(size, span=max(20, int(size ** 0.5) // 30))
+        parse = timeBest(lambda: [parseBlockXY(b) for b in blocks], repeat)
+        add = timeBest(lambda: buildByAddItem(blocks), repeat)
+        # optimizeBlockOrder会取出Grid中的区块，每次测试使用新建立的Grid
+        grids = [buildByAddItem(blocks) for i in range(repeat)]
+        order = min(timeit.repeat(lambda: list(optimizeBlockOrder(grids.pop())), number=1, repeat=repeat))
+        results['parseBlockXY/{0}'.format(size)] = parse
+        results['addItem/{0}'.format(size)] = add
+        results['optimizeBlockOrder/{0}'.format(size)] = order
+        print('{0:>10} {1:>14.4f} {2:>14.4f} {3:>14.4f}'.format(size, parse, add, order))
+
+
+def benchRewrite(sizes=(1000, 100000, 1000000), repeat=3):
+    """测试rewriteFile完成整个钻带路径优化的耗时及内存峰值，分别使用正面及反面钻带"""
+    print('{0:>10} {1:>7} {2:>12} {3:>14} {4:>12}'.format('blocks', 'side', 'rewrite(s)', 'blocks/s', 'peak(KB)'))
+    options = OptimizeOptions(metrics=False, cacheDir=None)
+    folder = tempfile.mkdtemp()
+    try:
+        for size in sizes:
+            for isTopSide, name in ((True, 'lsr0102'), (False, 'lsr0201')):
+                source = os.path.join(folder, name+'.src')
+                filePath = os.path.join(folder, name+'.prg')
+                writeProgram(source, size, glvFiles=4, isTopSide=isTopSide)
+                cond = thicknessCond(isTopSide, 2)
+                hasM900 = sniffPrg(source)[1]
+
+                def run():
+                    shutil.copy(source, filePath)
+                    start = time.time()
+                    rewriteFile(filePath, isTopSide, cond, hasM900, options)
+                    return time.time() - start
+                seconds = min(run() for i in range(repeat))
+                peak = 0
+                if sys.version_info[0] > 2:
+                    import tracemalloc
+                    shutil.copy(source, filePath)
+                    tracemalloc.start()
+                    try:
+                        rewriteFile(filePath, isTopSide, cond, hasM900, options)
+                        peak = tracemalloc.get_traced_memory()[1] / 1024.0
+                    finally:
+                        tracemalloc.stop()
+                side = 'top' if isTopSide else 'bottom'
+                results['rewrite/{0}/{1}'.format(side, size)] = seconds
+                results['rewritePeakKB/{0}/{1}'.format(side, size)] = peak
+                print('{0:>10} {1:>7} {2:>12.4f} {3:>14.0f} {4:>12.0f}'.format(size, side, seconds, size/seconds, peak))
+    finally:
+        shutil.rmtree(folder)
+
+
+def benchIncremental(sizes=(400000,), tools=(1, 2, 24, 30, 35, 40, 45, 50), repeat=2):
+    """
+    测试只修改一个区块坐标后，使用--previous增量优化与完整优化的耗时，两者的输出需要完全相同
+    每个刀具为一个区块组，修改的区块位于最后一个区块组中，其他区块组直接使用上一次保存的.segments索引
+    @return: 输出不同或增量优化不比完整优化快的钻带数量
+    @rtype: int
+    """
+    failures = 0
+    print('{0:>10} {1:>9} {2:>10} {3:>12} {4:>8}'.format('blocks', 'segments', 'full(s)', 'previous(s)', 'speedup'))
+    folder = tempfile.mkdtemp()
+    try:
+        previousDir = os.path.join(folder, 'previous')
+        os.mkdir(previousDir)
+        for size in sizes:
+            lines = list(generateProgram(size, tools, glvFiles=2))
+            previousPath = os.path.join(previousDir, 'lsr0102.prg')
+            with open(previousPath, 'w') as f:
+                f.write('\n'.join(lines)+'\n')
+            cond = thicknessCond(True, 2)
+            hasM900 = sniffPrg(previousPath)[1]
+            options = OptimizeOptions(metrics=False, cacheDir=None, segmentIndex=True)
+            rewriteFile(previousPath, True, cond, hasM900, options)
+
+            # 修改最后一个区块组中间的一个区块的X坐标
+            index = len(lines) - (size // len(tools)) - 3
+            while not lines[index].startswith('N'):
+                index += 1
+            lines[index] = lines[index].replace('G1X', 'G1X1', 1)
+            source = os.path.join(folder, 'lsr0102.src')
+            with open(source, 'w') as f:
+                f.write('\n'.join(lines)+'\n')
+            filePath = os.path.join(folder, 'lsr0102.prg')
+
+            def run(previous):
+                shutil.copy(source, filePath)
+                start = time.time()
+                rewriteFile(filePath, True, cond, hasM900, OptimizeOptions(metrics=False, cacheDir=None,
+                                                                           previousDir=previous))
+                seconds = time.time() - start
+                with open(filePath, 'rb') as f:
+                    return seconds, f.read()
+            full, expected = min(run(None) for i in range(repeat))
+            incremental, output = min(run(previousDir) for i in range(repeat))
+            results['incremental/full/{0}'.format(size)] = full
+            results['incremental/previous/{0}'.format(size)] = incremental
+            flag = ''
+            if output != expected:
+                failures += 1
+                flag = '  OUTPUT MISMATCH'
+            elif incremental >= full:
+                failures += 1
+                flag = '  NOT FASTER'
+            print('{0:>10} {1:>9} {2:>10.4f} {3:>12.4f} {4:>7.1f}x{5}'.format(size, len(tools), full, incremental,
+                                                                            full/incremental, flag))
+    finally:
+        shutil.rmtree(folder)
+    return failures
+
+
+def runPython(args, stdin=b''):
+    """在程序所在目录中运行Python子进程，返回(耗时, 标准输出, 标准错误)"""
+    folder = os.path.dirname(os.path.abspath(__file__))
+    start = time.time()
+    process = subprocess.Popen([sys.executable] + args, cwd=folder, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = process.communicate(stdin)
+    return time.time() - start, out.decode('utf-8', 'replace'), err.decode('utf-8', 'replace')
+
+
+def benchStartup(repeat=5, budget=STARTUP_BUDGET):
+    """
+    测试交互模式的冷启动时间(输入空的钻带程序名后立即退出)，分别直接运行LaserPrgOptimizer.py及通过laserprg.py运行，
+    并检查导入LaserPrgOptimizer时没有导入HEAVY_MODULES中的模块
+    @param budget: 直接运行LaserPrgOptimizer.py的时间上限(秒)
+    @return: 超过时间上限或导入了较重模块时返回失败的检查项数量
+    @rtype: int
+    """
+    failures = 0
+    print('{0:<24} {1:>10}'.format('entry', 'seconds'))
+    for name, script in (('script', 'LaserPrgOptimizer.py'), ('launcher', 'laserprg.py')):
+        seconds = min(runPython([script], b'\n')[0] for i in range(repeat))
+        results['startup/'+name] = seconds
+        flag = ''
+        if name == 'script' and seconds > budget:
+            failures += 1
+            flag = '  OVER BUDGET ({0}s)'.format(budget)
+        print('{0:<24} {1:>10.4f}{2}'.format(script, seconds, flag))
+
+    if sys.version_info >= (3, 7):
+        # -X importtime输出每个模块的导入耗时(微秒)，最后一行为LaserPrgOptimizer及其导入的全部模块
+        err = runPython(['-X', 'importtime', '-c', 'import LaserPrgOptimizer'])[2]
+        lines = [line for line in err.splitlines() if line.rstrip().endswith('| LaserPrgOptimizer')]
+        if lines:
+            results['startup/import'] = int(lines[-1].split('|')[1]) / 1e6
+            print('{0:<24} {1:>10.4f}'.format('import', results['startup/import']))
+
+    code = 'import sys, LaserPrgOptimizer; print(",".join(m for m in {0!r} if m in sys.modules))'.format(HEAVY_MODULES)
+    loaded = runPython(['-c', code])[1].strip()
+    if loaded:
+        failures += 1
+        print('heavy modules imported at startup: '+loaded)
+    return failures
+
+
+def compareResults(filePath, tolerance=0.2):
+    """
+    将本次测试结果与之前保存的结果比较，耗时或内存增加超过tolerance时视为性能退化
+    @param filePath: 之前使用--save保存的JSON结果文件
+    @return: 性能退化的测试项数量
+    @rtype: int
+    """
+    with open(filePath) as f:
+        baseline = json.load(f)
+    regressions = 0
+    print('{0:<32} {1:>12} {2:>12} {3:>8}'.format('benchmark', 'baseline', 'current', 'ratio'))
+    for name in sorted(set(baseline) & set(results)):
+        if not baseline[name]:
+            continue
+        ratio = results[name] / baseline[name]
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions += 1
+            flag = '  REGRESSION'
+        print('{0:<32} {1:>12.4f} {2:>12.4f} {3:>7.2f}x{4}'.format(name, baseline[name], results[name], ratio, flag))
+    return regressions
+
+
+# 可以在命令行中选择运行的测试项，按列表顺序运行
+benchmarks = [
+    ('countItems', benchCountItems),
+    ('fromItems', benchFromItems),
+    ('memory', benchMemory),
+    ('numpy', benchNumpyOrder),
+    ('dense', benchDenseCells),
+    ('tokenizer', benchTokenizer),
+    ('hotpaths', benchHotPaths),
+    ('rewrite', benchRewrite),
+    ('incremental', benchIncremental),
+    ('startup', benchStartup),
+]
+
+
+def parseArgs(argv):
+    """解析性能测试的命令行参数"""
+    parser = argparse.ArgumentParser(description='三菱镭射机加工程序路径优化程序性能测试')
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help='需要运行的测试项({0})，默认运行全部测试'.format(', '.join(n for n, f in benchmarks)))
+    parser.add_argument('--sizes', type=lambda s: [int(v) for v in s.split(',')],
+                        help='hotpaths、rewrite及incremental测试的区块数量，以逗号分隔，如 1000,100000,5000000')
+    parser.add_argument('--save', metavar='JSON', help='将测试结果保存为JSON文件')
+    parser.add_argument('--compare', metavar='JSON', help='与之前保存的测试结果比较，有性能退化时返回1')
+    parser.add_argument('--generate', metavar='PRG', help='只生成测试钻带，文件名需包含lsrXXYY以区分正反面')
+    parser.add_argument('--blocks', type=int, default=100000, help='生成钻带的区块数量，默认为100000')
+    parser.add_argument('--tools', default='1,2,5', help='生成钻带的刀具编号(1-50)，以逗号分隔，默认为1,2,5')
+    parser.add_argument('--glv', type=int, default=1, help='生成钻带每个刀具中的GLV文件个数，默认为1')
+    parser.add_argument('--seed', type=int, default=0, help='生成钻带的随机数种子')
+    parser.add_argument('--startup-budget', type=float, default=STARTUP_BUDGET, metavar='SECONDS',
+                        help='startup测试中交互模式冷启动的时间上限，默认为{0}秒'.format(STARTUP_BUDGET))
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(n for n, f in benchmarks)
+    if unknown:
+        parser.error('unknown benchmark: '+', '.join(sorted(unknown)))
+    return args
+
+
+if __name__ == '__main__':
+    args = parseArgs(sys.argv[1:])
+    if args.generate:
+        isTopSide = prgSide(os.path.basename(args.generate))
+        if isTopSide is None:
+            sys.exit('Cannot detect the side from file name: '+args.generate)
+        writeProgram(args.generate, args.blocks, tools=[int(t) for t in args.tools.split(',')],
+                     glvFiles=args.glv, isTopSide=isTopSide, seed=args.seed)
+        sys.exit(0)
+    failures = 0
+    for name, func in benchmarks:
+        if args.names and name not in args.names:
+            continue
+        print('== {0} =='.format(name))
+        if args.sizes and name in ('hotpaths', 'rewrite', 'incremental'):
+            failures += func(args.sizes) or 0
+        elif name == 'startup':
+            failures += func(budget=args.startup_budget)
+        elif name in ('memory', 'incremental'):
+            failures += func()
+        else:
+            func()
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True, separators=(',', ': '))
+    if args.compare and compareResults(args.compare):
+        failures += 1
+    if failures:
+        sys.exit(1)
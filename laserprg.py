@@ -0,0 +1,11 @@
+#!/usr/bin/python
+# -*-coding:utf-8-*-
+
+# 启动脚本：直接运行LaserPrgOptimizer.py时每次都需要重新编译整个脚本，
+# 通过导入运行时可以使用已编译的.pyc缓存，缩短每次启动的时间，命令行参数与LaserPrgOptimizer.py相同
+import sys
+
+from LaserPrgOptimizer import main
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))